@@ -494,15 +494,19 @@ def main():
         print(f"Please place PDF or TXT files in '{input_folder}'.")
         return
 
+    from app.pdf_cache import PDF_TEXT_CACHE_DIR, PDFTextCache
+    from app.pdf_processor import extract_text_from_pdf
+    # Kept next to this script by default, since test_pdfs/ is re-extracted after every regex change
+    pdf_cache = PDFTextCache(disk_dir=PDF_TEXT_CACHE_DIR or os.path.join(base_dir, "pdf_text_cache"))
+
     print("Starting extraction...")
     with open(output_file, 'w', encoding='utf-8') as out_f:
         for filename in sorted(os.listdir(input_folder)):
             filepath = os.path.join(input_folder, filename)
             text = ""
             if filename.lower().endswith('.pdf'):
-                from app.pdf_processor import extract_text_from_pdf
                 print(f"Processing PDF: {filename}")
-                text = extract_text_from_pdf(filepath)
+                text = extract_text_from_pdf(filepath, cache=pdf_cache)
             elif filename.lower().endswith('.txt'):
                 print(f"Processing TXT: {filename}")
                 for enc in ('utf-8', 'cp1256'):
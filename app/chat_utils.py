@@ -1,12 +1,21 @@
 import os
 import sys
 import json
+import re
 import time
+import hashlib
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
 from dotenv import find_dotenv, load_dotenv
 from openai import OpenAI
 from sqlalchemy import text
 from app.database import engine
-from app.ollama_fallback import call_ollama, should_fallback_openrouter
+from app.llm_router import HedgedRouter, Provider
+from app.ollama_fallback import call_ollama
+from app.sql_cache import TextToSQLCache
+from app.sql_examples import SQL_EXAMPLES, FewShotExampleStore, format_examples
+from app.sql_rules import match_sql_rule
 
 env_file = find_dotenv()
 if env_file:
@@ -24,23 +33,17 @@ if api_key:
 MODEL_NAME = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 
 
-def get_sql_from_llm(user_question):
-    """
-    Convert natural language question to SQL using Groq LLM.
-    Falls back to local Ollama on ANY API failure.
-    """
-    print("\n" + "═"*70, flush=True)
-    print(f"[TEXT-SQL] INPUT QUESTION: {user_question}", flush=True)
-    print("═"*70 + "\n", flush=True)
+def call_groq(messages):
+    response = client.chat.completions.create(model=MODEL_NAME, messages=messages)
+    return response.choices[0].message.content.strip()
 
-    if not client:
-        print("[ERROR] Groq API key not configured", flush=True)
-        return None
 
-    # -----------------------------------------------------------------------
-    # SCHEMA PROMPT — matches the REAL PostgreSQL (Neon) database exactly
-    # -----------------------------------------------------------------------
-    schema_info = """
+sql_router = HedgedRouter([Provider("groq", call_groq), Provider("ollama", call_ollama)])
+
+# -----------------------------------------------------------------------
+# SCHEMA PROMPT — matches the REAL PostgreSQL (Neon) database exactly
+# -----------------------------------------------------------------------
+SCHEMA_INFO = """
 أنت خبير SQL متخصص بقاعدة بيانات قضائية فلسطينية (PostgreSQL).
 
 ═══════════════════════════════════════════════════
@@ -100,139 +103,158 @@ def get_sql_from_llm(user_question):
 7. لا تستخدم JOIN على نفس الجدول
 8. أرجع SQL فقط بدون أي شرح
 
-═══════════════════════════════════════════════════
- أمثلة صحيحة ومُختبَرة على قاعدة البيانات الحقيقية
-═══════════════════════════════════════════════════
-
-س: كم عدد القضايا؟
-ج: SELECT COUNT(*) FROM entities;
-
-س: من هو محامي المدعى عليه في القضية رقم 588/2021؟
-ج: SELECT defendant_lawyer FROM entities WHERE case_number = '588/2021';
-
-س: من هو محامي المدعي في القضية رقم 76/2021؟
-ج: SELECT plaintiff_lawyer FROM entities WHERE case_number = '76/2021';
-
-س: ما هو تاريخ الحكم في القضية رقم 563/2021؟
-ج: SELECT judgment_date FROM entities WHERE case_number = '563/2021';
-
-س: كم عدد القضاة في القضية رقم 476/2021؟
-ج: SELECT jsonb_array_length(judge::jsonb) FROM entities WHERE case_number = '476/2021';
-
-س: كم عدد المدعى عليهم في القضية رقم 552/2021؟
-ج: SELECT jsonb_array_length(defendant::jsonb) FROM entities WHERE case_number = '552/2021';
-
-س: كم عدد القضايا بتاريخ 1/9/2021؟
-ج: SELECT COUNT(*) FROM entities WHERE replace(judgment_date, ' ', '') = '1/9/2021';
-
-س: ما هي المواد القانونية في القضية رقم 476/2021؟
-ج: SELECT jsonb_array_elements_text(legal_articles::jsonb) FROM entities WHERE case_number = '476/2021';
-
-س: كم عدد المواد القانونية في القضية رقم 72/2021؟
-ج: SELECT jsonb_array_length(legal_articles::jsonb) FROM entities WHERE case_number = '72/2021';
-
-س: كم عدد المحاكم المختلفة؟
-ج: SELECT COUNT(DISTINCT court_name) FROM entities;
+"""
 
-س: ما هو رقم القضية الجزائية؟
-ج: SELECT case_number FROM entities WHERE case_type = 'جزائي';
+SYSTEM_PROMPT = (
+    "أنت خبير SQL متخصص في القضايا القانونية العربية. "
+    "مهمتك هي تحويل السؤال إلى SQL بدقة متناهية.\n" + SCHEMA_INFO
+)
+
+
+# Only the k most similar examples go into the prompt; 0 sends all of them
+TEXT_SQL_FEW_SHOT_K = int(os.getenv("TEXT_SQL_FEW_SHOT_K", "6"))
+example_store = FewShotExampleStore()
+
+# Cached SQL is only valid for the prompt, examples and model that produced it
+SCHEMA_PROMPT_HASH = hashlib.sha256(
+    f"{MODEL_NAME}\n{TEXT_SQL_FEW_SHOT_K}\n{SYSTEM_PROMPT}{format_examples(SQL_EXAMPLES)}".encode("utf-8")
+).hexdigest()[:16]
+sql_cache = TextToSQLCache(namespace=SCHEMA_PROMPT_HASH)
+
+
+class TextToSQLStats:
+    """Fast-path hit rate and latency of each text-to-SQL path (recent window)."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._latencies = {path: deque(maxlen=window) for path in ("rules", "cache", "llm")}
+        self._counts = {path: 0 for path in ("rules", "cache", "llm")}
+
+    def record(self, path: str, ms: float):
+        with self._lock:
+            self._counts[path] += 1
+            self._latencies[path].append(ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = sum(self._counts.values())
+            result = {"fast_path_hit_ratio": self._counts["rules"] / total if total else 0.0}
+            for path, latencies in self._latencies.items():
+                ordered = sorted(latencies)
+                result[path] = {
+                    "requests": self._counts[path],
+                    "p50_ms": round(ordered[len(ordered) // 2], 3) if ordered else None,
+                    "p95_ms": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else None,
+                }
+            return result
 
-س: ما هي القضايا بتاريخ 15/9/2021؟
-ج: SELECT case_number FROM entities WHERE replace(judgment_date, ' ', '') = '15/9/2021';
 
-س: من هو المدعي في القضية 563/2021 وكم عدد قضاتها؟
-ج: SELECT plaintiff, jsonb_array_length(judge::jsonb) AS judges_count FROM entities WHERE case_number = '563/2021';
+text_to_sql_stats = TextToSQLStats()
 
-س: ما هي القضايا التي استندت للمادة 152؟
-ج: SELECT case_number FROM entities WHERE legal_articles::text LIKE '%152%';
 
-س: ما هي القضايا التي محامي المدعى عليه فيها محمد جرار؟
-ج: SELECT case_number FROM entities WHERE defendant_lawyer::text LIKE '%محمد جرار%';
+def get_sql(user_question) -> Tuple[Optional[str], Dict[str, Any], str]:
+    """
+    Convert a natural language question to ``(sql, bind parameters, path)``.
+    Known question shapes are answered by the rule fast path (app/sql_rules.py),
+    then the normalised-question cache (app/sql_cache.py) is tried; everything
+    else goes to the LLM. ``path`` is "rules", "cache" or "llm".
+    """
+    start = time.perf_counter()
+    matched = match_sql_rule(user_question)
+    if matched is not None:
+        sql, params, rule = matched
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        text_to_sql_stats.record("rules", elapsed_ms)
+        print(f"[TEXT-SQL] Rule '{rule}' matched in {elapsed_ms:.3f} ms: {sql} {params}", flush=True)
+        return sql, params, "rules"
+
+    sql = sql_cache.get(user_question)
+    if sql is not None:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        text_to_sql_stats.record("cache", elapsed_ms)
+        print(f"[TEXT-SQL] Cache hit in {elapsed_ms:.3f} ms: {sql}", flush=True)
+        return sql, {}, "cache"
+
+    sql = get_sql_from_llm(user_question)
+    text_to_sql_stats.record("llm", (time.perf_counter() - start) * 1000)
+    return sql, {}, "llm"
+
+
+def remember_sql(user_question, sql):
+    """Cache LLM-generated SQL once it has executed without error."""
+    if sql_cache.put(user_question, sql):
+        print("[TEXT-SQL] Cached SQL template for this question shape", flush=True)
+
+
+def extract_sql(raw: str) -> str:
+    """Strip markdown fences and extract the SQL statement.
+
+    Handles:
+      - Bare SELECT ...
+      - WITH cte AS (SELECT ...)  — Common Table Expressions
+      - EXPLAIN [ANALYZE] SELECT ... — query-plan prefixes
+    Returns the cleaned SQL string, or the stripped raw text if no
+    recognised keyword is found (so callers still receive something
+    to validate rather than a silent None).
+    """
+    # 1. Strip markdown code fences
+    if "```sql" in raw:
+        raw = raw.split("```sql")[1].split("```")[0].strip()
+    elif "```" in raw:
+        raw = raw.split("```")[1].split("```")[0].strip()
+
+    # 2. Match any of the recognised SQL entry-points:
+    match = re.search(
+        r'((?:WITH|EXPLAIN)\s+.*|SELECT\s+.*)',
+        raw,
+        re.IGNORECASE | re.DOTALL,
+    )
+    if match:
+        raw = match.group(1).strip()
 
-س: كم عدد القضايا التي ترست العالمية مدعية فيها؟
-ج: SELECT COUNT(*) FROM entities WHERE plaintiff::text LIKE '%ترست%';
+    return raw.rstrip(';').strip()
 
-س: كم عدد قضايا القاضي أحمد المغني؟
-ج: SELECT COUNT(*) FROM entities WHERE judge::text LIKE '%أحمد المغني%';
 
-س: ما هو الحكم في القضية 413/2019؟
-ج: SELECT verdict FROM entities WHERE case_number = '413/2019';
+def build_system_prompt(user_question, k=TEXT_SQL_FEW_SHOT_K, exclude=None):
+    """
+    Schema prompt plus the k few-shot examples most similar to the question.
+    ``k <= 0`` sends every example (the original static prompt).
+    ``exclude`` leaves one example out (used by the offline benchmark).
+    """
+    if k <= 0:
+        examples = [e for i, e in enumerate(SQL_EXAMPLES) if i != exclude]
+    else:
+        examples = example_store.top_k(user_question, k, exclude=exclude)
+    return SYSTEM_PROMPT + format_examples(examples)
 
-س: ما هي أبكر قضية من حيث التاريخ؟
-ج: SELECT case_number, judgment_date FROM entities WHERE judgment_date IS NOT NULL AND judgment_date != '' AND judgment_date LIKE '%/%' ORDER BY CASE WHEN replace(judgment_date, ' ', '') ~ '^\\d{4}' THEN to_date(replace(judgment_date, ' ', ''), 'YYYY/MM/DD') ELSE to_date(replace(judgment_date, ' ', ''), 'DD/MM/YYYY') END ASC LIMIT 1;
 
-س: ابحث عن علاقات أحمد
-ج: SELECT * FROM entity_relationships WHERE from_entity LIKE '%أحمد%' OR to_entity LIKE '%أحمد%';
-"""
+def get_sql_from_llm(user_question):
+    """
+    Convert natural language question to SQL using Groq LLM.
+    Hedged to local Ollama when Groq is slower than usual, and falls back
+    to it at once on ANY API failure.
+    """
+    print("\n" + "═"*70, flush=True)
+    print(f"[TEXT-SQL] INPUT QUESTION: {user_question}", flush=True)
+    print("═"*70 + "\n", flush=True)
 
-    system_prompt = (
-        "أنت خبير SQL متخصص في القضايا القانونية العربية. "
-        "مهمتك هي تحويل السؤال إلى SQL بدقة متناهية.\n" + schema_info
-    )
+    if not client:
+        print("[ERROR] Groq API key not configured", flush=True)
+        return None
 
     messages = [
-        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": build_system_prompt(user_question)},
         {"role": "user", "content": f"حول هذا السؤال إلى SQL: {user_question}"}
     ]
 
-    import re
-
-    def _extract_sql(raw: str) -> str:
-        """Strip markdown fences and extract the SQL statement.
-
-        Handles:
-          - Bare SELECT ...
-          - WITH cte AS (SELECT ...)  — Common Table Expressions
-          - EXPLAIN [ANALYZE] SELECT ... — query-plan prefixes
-        Returns the cleaned SQL string, or the stripped raw text if no
-        recognised keyword is found (so callers still receive something
-        to validate rather than a silent None).
-        """
-        # 1. Strip markdown code fences
-        if "```sql" in raw:
-            raw = raw.split("```sql")[1].split("```")[0].strip()
-        elif "```" in raw:
-            raw = raw.split("```")[1].split("```")[0].strip()
-
-        # 2. Match any of the recognised SQL entry-points:
-        match = re.search(
-            r'((?:WITH|EXPLAIN)\s+.*|SELECT\s+.*)',
-            raw,
-            re.IGNORECASE | re.DOTALL,
-        )
-        if match:
-            raw = match.group(1).strip()
-
-        return raw.rstrip(';').strip()
-
-    max_retries = 3
-    final_sql = None
-    for attempt in range(max_retries):
-        try:
-            print(f"[DEBUG] Calling Groq ({MODEL_NAME}) (attempt {attempt + 1})...", flush=True)
-            response = client.chat.completions.create(model=MODEL_NAME, messages=messages)
-            sql = response.choices[0].message.content.strip()
-            final_sql = _extract_sql(sql)
-            break
-
-        except Exception as e:
-            print(f"[TEXT-SQL] Groq error (attempt {attempt + 1}): {e}", flush=True)
-
-            # Always fallback on rate-limit errors OR on the final retry
-            if should_fallback_openrouter(e) or attempt == max_retries - 1:
-                try:
-                    print("[TEXT-SQL] Falling back to local qwen3 via Ollama...", flush=True)
-                    raw = call_ollama(messages)
-                    final_sql = _extract_sql(raw)
-                    break
-                except Exception as fallback_err:
-                    print(f"[TEXT-SQL] Ollama fallback failed: {fallback_err}", flush=True)
-                    final_sql = None
-                    break
-
-            if attempt < max_retries - 1:
-                time.sleep(1)
-            continue
+    # Groq first; hedged to / failed over to local Ollama (app/llm_router.py)
+    try:
+        raw, provider = sql_router.call(messages)
+        print(f"[TEXT-SQL] SQL generated by {provider}", flush=True)
+        final_sql = extract_sql(raw)
+    except Exception as e:
+        print(f"[TEXT-SQL] All providers failed: {e}", flush=True)
+        final_sql = None
 
     print("\n" + "═"*70, flush=True)
     print(f"[TEXT-SQL] FINAL SQL RETURNED: {final_sql}", flush=True)
@@ -240,66 +262,75 @@ def get_sql_from_llm(user_question):
     return final_sql
 
 
-def execute_sql(sql, user_question=""):
+# Rows returned with the total of a COUNT(*) question
+SQL_DETAILS_ROW_CAP = int(os.getenv("SQL_DETAILS_ROW_CAP", "200"))
+TOTAL_COLUMN = "__total"
+
+_SIMPLE_COUNT = re.compile(r'^\s*SELECT\s+COUNT\(\s*\*\s*\)(?:\s+AS\s+\w+)?\s+(FROM\s.*)$', re.IGNORECASE | re.DOTALL)
+_NOT_ROW_LEVEL = re.compile(r'\b(?:GROUP\s+BY|HAVING|UNION|INTERSECT|EXCEPT|LIMIT|OFFSET|FETCH)\b', re.IGNORECASE)
+
+
+def count_with_rows_sql(sql, row_cap=SQL_DETAILS_ROW_CAP):
+    """
+    Rewrite ``SELECT COUNT(*) FROM ...`` into one query that returns the
+    matching rows (at most ``row_cap``) together with the total as a window
+    function column. Returns None for queries that are not a plain count
+    (GROUP BY / HAVING / UNION / LIMIT ... have no row-level details).
+    """
+    match = _SIMPLE_COUNT.match(sql.strip().rstrip(';'))
+    if match is None or _NOT_ROW_LEVEL.search(match.group(1)):
+        return None
+    return f"SELECT *, COUNT(*) OVER () AS {TOTAL_COLUMN} {match.group(1).strip()} LIMIT {int(row_cap)}"
+
+
+def execute_sql(sql, user_question="", params=None):
     """
     Execute SQL query using SQLAlchemy engine.
-    If COUNT query detected, also fetch full details.
+    ``params`` are bind parameters for ``:name`` placeholders in ``sql``.
+    A plain COUNT(*) query is answered in one round trip with the count and
+    up to SQL_DETAILS_ROW_CAP matching rows.
     """
+    params = params or {}
     if not sql or not sql.lower().startswith("select"):
         return {"error": "Only SELECT queries allowed or invalid SQL generated"}
 
     try:
         with engine.connect() as connection:
-            result = connection.execute(text(sql))
+            count_sql = count_with_rows_sql(sql)
+            if count_sql is not None:
+                details = [dict(row._mapping) for row in connection.execute(text(count_sql), params).fetchall()]
+                # Every row carries the same total; no rows means nothing matched
+                count_value = details[0][TOTAL_COLUMN] if details else 0
+                for row in details:
+                    row.pop(TOTAL_COLUMN, None)
+
+                return {
+                    "success": True,
+                    "count": count_value,
+                    "summary": f"تم العثور على {count_value} من القضايا",
+                    "data": details,
+                    "sql": count_sql,
+                }
+
+            result = connection.execute(text(sql), params)
             rows = result.fetchall()
 
             # Map Row objects to dictionaries
             results = [dict(row._mapping) for row in rows]
 
-            # Detect if this is a COUNT(*) query
-            is_count_query = "count(*)" in sql.lower()
-
-            if is_count_query and results:
-                # Extract the count value from the first result
+            # Aggregate COUNT(*) shapes (GROUP BY / HAVING / UNION ...):
+            # return only the aggregate count
+            if "count(*)" in sql.lower() and results:
                 count_value = list(results[0].values())[0] if results[0] else 0
-
-                import re
-
-                # -------------------------------------------------------
-                # Edge-case guard: GROUP BY / HAVING / UNION queries
-                # -------------------------------------------------------
-                sql_upper = sql.upper()
-                has_group_by = re.search(r'\bGROUP\s+BY\b', sql_upper) is not None
-                has_having   = re.search(r'\bHAVING\b',     sql_upper) is not None
-                has_union    = re.search(r'\bUNION\b',       sql_upper) is not None
-
-                if has_group_by or has_having or has_union:
-                    # Return only the aggregate count — no re-query
-                    return {
-                        "success": True,
-                        "count": count_value,
-                        "summary": f"تم العثور على {count_value} من القضايا",
-                        "data": results,
-                        "sql": sql,
-                    }
-
-                # Safe to replace COUNT(*) with * and fetch full rows
-                details_sql = re.sub(r'count\(\s*\*\s*\)', '*', sql, flags=re.IGNORECASE)
-
-                # Execute the details query
-                details_result = connection.execute(text(details_sql))
-                details_rows = details_result.fetchall()
-                details = [dict(row._mapping) for row in details_rows]
-
                 return {
                     "success": True,
                     "count": count_value,
                     "summary": f"تم العثور على {count_value} من القضايا",
-                    "data": details,
-                    "sql": details_sql,
+                    "data": results,
+                    "sql": sql,
                 }
 
             return {"success": True, "count": len(results), "data": results, "sql": sql}
 
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
@@ -0,0 +1,199 @@
+"""
+Latency-aware, hedged routing between LLM providers (Groq first, local
+Ollama second) for text-to-SQL.
+
+Each provider keeps rolling latency and error statistics and a circuit
+breaker. A call goes to the first provider whose breaker is closed. If it
+has not answered within its own recent p90 latency (never less than
+``TEXT_SQL_HEDGE_FLOOR_MS``), the same request is also sent to the next
+provider and whichever answers first wins. A failure moves on to the next
+provider at once instead of sleeping and retrying.
+
+A breaker opens when the recent error rate reaches
+``TEXT_SQL_BREAKER_ERROR_RATE``. After ``TEXT_SQL_BREAKER_COOLDOWN`` seconds
+one probe request is let through; it closes the breaker again on success.
+
+Calls are blocking client calls run on a small thread pool. A losing call
+cannot be cancelled, so it finishes in the background and its latency is
+still recorded.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+HEDGE_FLOOR_MS = float(os.getenv("TEXT_SQL_HEDGE_FLOOR_MS", "800"))
+HEDGE_QUANTILE = float(os.getenv("TEXT_SQL_HEDGE_QUANTILE", "0.9"))
+BREAKER_ERROR_RATE = float(os.getenv("TEXT_SQL_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("TEXT_SQL_BREAKER_COOLDOWN", "30"))
+
+# Upper bounds (ms) of the latency histogram buckets
+HISTOGRAM_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+_WINDOW = 50
+# Samples needed before the window's p90 / error rate is trusted
+_MIN_SAMPLES = 10
+
+
+class Provider:
+    def __init__(self, name: str, call: Callable[[List[Dict]], str]):
+        self.name = name
+        self._call = call
+        self._lock = threading.Lock()
+        # (latency_ms, ok) of recent calls
+        self._window: deque = deque(maxlen=_WINDOW)
+        self._histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.state = "closed"
+        self._open_until = 0.0
+        self._probing = False
+
+    def __call__(self, messages: List[Dict]) -> str:
+        start = time.perf_counter()
+        try:
+            result = self._call(messages)
+        except Exception:
+            self._record((time.perf_counter() - start) * 1000, ok=False)
+            raise
+        self._record((time.perf_counter() - start) * 1000, ok=True)
+        return result
+
+    def _record(self, ms: float, ok: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += not ok
+            bucket = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if ms <= bound), len(HISTOGRAM_BUCKETS_MS))
+            self._histogram[bucket] += 1
+
+            if self.state == "half_open":
+                self._probing = False
+                if ok:
+                    self.state = "closed"
+                    self._window.clear()
+                else:
+                    self._trip()
+            self._window.append((ms, ok))
+            if self.state == "closed" and len(self._window) >= _MIN_SAMPLES:
+                failures = sum(not ok for _, ok in self._window)
+                if failures / len(self._window) >= BREAKER_ERROR_RATE:
+                    self._trip()
+
+    def _trip(self):
+        self.state = "open"
+        self._open_until = time.monotonic() + BREAKER_COOLDOWN
+        print(f"[LLM ROUTER] Circuit opened for {self.name} ({BREAKER_COOLDOWN:.0f}s)", flush=True)
+
+    def available(self) -> bool:
+        """Whether the breaker lets a request through (claims the half-open probe)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() >= self._open_until:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before hedging: the recent p90 of successful calls."""
+        with self._lock:
+            latencies = sorted(ms for ms, ok in self._window if ok)
+        if len(latencies) < _MIN_SAMPLES:
+            return HEDGE_FLOOR_MS / 1000
+        quantile = latencies[min(int(len(latencies) * HEDGE_QUANTILE), len(latencies) - 1)]
+        return max(quantile, HEDGE_FLOOR_MS) / 1000
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(ms for ms, _ in self._window)
+            window_errors = sum(not ok for _, ok in self._window)
+
+            def quantile(q):
+                return round(latencies[min(int(len(latencies) * q), len(latencies) - 1)], 1) if latencies else None
+
+            labels = [f"le_{bound}" for bound in HISTOGRAM_BUCKETS_MS] + ["inf"]
+            return {
+                "state": self.state,
+                "calls": self.calls,
+                "errors": self.errors,
+                "recent_error_rate": window_errors / len(self._window) if self._window else 0.0,
+                "p50_ms": quantile(0.5),
+                "p90_ms": quantile(0.9),
+                "p99_ms": quantile(0.99),
+                "histogram_ms": dict(zip(labels, self._histogram)),
+            }
+
+
+class HedgedRouter:
+    def __init__(self, providers: Sequence[Provider], max_workers: int = 16):
+        self.providers = list(providers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def call(self, messages: List[Dict]) -> Tuple[str, str]:
+        """``(response text, provider name)``; raises when every provider failed."""
+        remaining = list(self.providers)
+        launched: List[Provider] = []
+        pending: Dict[Future, Provider] = {}
+        hedged = set()
+        errors = []
+
+        def launch(hedge: bool) -> bool:
+            # Breakers are asked only here, one provider at a time, so a
+            # half-open probe is claimed only by a provider that is launched
+            provider = next((p for p in remaining if p.available()), None)
+            if provider is None:
+                if launched or not remaining:
+                    return False
+                # Every breaker is open: trying is better than failing outright
+                provider = remaining[0]
+            remaining.remove(provider)
+            launched.append(provider)
+            pending[self._pool.submit(provider, messages)] = provider
+            with self._lock:
+                if hedge:
+                    self.hedges += 1
+                    hedged.add(provider.name)
+                elif errors:
+                    self.failovers += 1
+            if hedge:
+                print(f"[LLM ROUTER] {first.name} slower than its p90, hedging to {provider.name}", flush=True)
+            return True
+
+        launch(hedge=False)
+        first = launched[0]
+        can_hedge = True
+        while pending:
+            # Only the first provider is given a deadline before hedging
+            timeout = first.hedge_delay() if can_hedge and remaining and len(pending) == 1 and not errors else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                can_hedge = launch(hedge=True)
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"[LLM ROUTER] {provider.name} failed: {e}", flush=True)
+                    errors.append(f"{provider.name}: {e}")
+                    if not pending:
+                        launch(hedge=False)
+                    continue
+                if provider.name in hedged:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return text, provider.name
+        raise RuntimeError("All LLM providers failed: " + "; ".join(errors))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            routing = {"hedges": self.hedges, "hedge_wins": self.hedge_wins, "failovers": self.failovers}
+        return {"routing": routing, **{p.name: p.stats() for p in self.providers}}
@@ -1,19 +1,26 @@
 
 import os
-from fastapi import FastAPI, File, UploadFile, Form
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, Form, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import google.generativeai as genai
 import json
-import shutil
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine
 from app.models import Document, Entity, EntityRelationship
 from typing import Optional, List
 from sqlalchemy import or_, cast, String
-from app.pdf_processor import extract_text_from_pdf
-from openai import OpenAI
+from app.pdf_processor import PDFTooLargeError, extract_text_from_pdf, pdf_text_cache
+from app.rag.answer_cache import SemanticAnswerCache, content_hash, question_keys
+from app.rag.context_packer import ContextPacker
+from app.rag.reranker import RERANK_TOP_N
+from openai import AsyncOpenAI
 
 load_dotenv()
 gemini_api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GEMINI")
@@ -29,17 +36,136 @@ openrouter_api_key = (
 )
 or_client = None
 if openrouter_api_key:
-    or_client = OpenAI(
+    or_client = AsyncOpenAI(
         base_url="https://openrouter.ai/api/v1",
         api_key=openrouter_api_key
     )
 OR_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemma-3-4b-it:free")
 
+# Per-provider caps on in-flight LLM calls in this worker; excess requests
+# wait on the semaphore instead of piling up on the provider's rate limit
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+OPENROUTER_MAX_CONCURRENCY = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "4"))
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+openrouter_semaphore = asyncio.Semaphore(OPENROUTER_MAX_CONCURRENCY)
+
+
+async def gemini_generate(prompt: str) -> str:
+    """Gemini 2.5 Flash completion without blocking the event loop."""
+    async with gemini_semaphore:
+        model = genai.GenerativeModel("gemini-2.5-flash")
+        response = await model.generate_content_async(prompt)
+    return getattr(response, "text", "")
+
+
+async def openrouter_chat(messages: list) -> str:
+    async with openrouter_semaphore:
+        response = await or_client.chat.completions.create(
+            model=OR_MODEL,
+            messages=messages
+        )
+    return response.choices[0].message.content
+
+
+async def gemini_stream(prompt: str):
+    """Yield Gemini answer text as it is generated."""
+    async with gemini_semaphore:
+        model = genai.GenerativeModel("gemini-2.5-flash")
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+async def openrouter_stream(messages: list):
+    async with openrouter_semaphore:
+        stream = await or_client.chat.completions.create(
+            model=OR_MODEL,
+            messages=messages,
+            stream=True
+        )
+        async for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                yield text
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def sse_answer(tokens, head: dict, request_start: float, label: str, on_complete=None):
+    """Server-Sent Events for a streamed answer: ``sources``, ``token``..., then ``done``.
+
+    Time to first token is logged both from the start of the request and from
+    the start of the LLM call. ``on_complete(answer, llm_ms)`` runs once the
+    whole answer has been received.
+    """
+    yield sse_event("sources", head)
+    llm_start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    try:
+        async for text in tokens:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        yield sse_event("error", {"error": str(e)})
+        return
+
+    end = time.perf_counter()
+    first_token_at = first_token_at or end
+    ttft_ms = (first_token_at - request_start) * 1000
+    print(
+        f"[{label}] stream ttft={ttft_ms:.0f} ms (llm ttft={(first_token_at - llm_start) * 1000:.0f} ms), "
+        f"total={(end - request_start) * 1000:.0f} ms",
+        flush=True,
+    )
+    if on_complete is not None and parts:
+        on_complete("".join(parts), (end - llm_start) * 1000)
+    yield sse_event("done", {"ttft_ms": round(ttft_ms), "total_ms": round((end - request_start) * 1000)})
+
+
+async def single_chunk(text: str):
+    yield text
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Keep reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Create tables if they don't exist
 from app.models import Base
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the RAG retrieval stack once per worker instead of once per request."""
+    app.state.vector_store = None
+    app.state.context_packer = None
+    app.state.answer_cache = SemanticAnswerCache()
+    start = time.perf_counter()
+    try:
+        from app.rag.vector_store import VectorStoreManager
+
+        vector_store = VectorStoreManager()
+        vector_store.warmup()
+        app.state.vector_store = vector_store
+        app.state.context_packer = ContextPacker.from_encoder(vector_store.encoder)
+        print(f"[STARTUP] Vector store ready in {(time.perf_counter() - start) * 1000:.0f} ms", flush=True)
+    except Exception as e:
+        print(f"[STARTUP] Vector store unavailable, RAG search disabled: {e}", flush=True)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +196,15 @@ def get_db():
     finally:
         db.close()
 
+def get_vector_store(request: Request):
+    return request.app.state.vector_store
+
+def get_context_packer(request: Request):
+    return request.app.state.context_packer
+
+def get_answer_cache(request: Request):
+    return request.app.state.answer_cache
+
 @app.post("/api/extract")
 async def extract_entities(request: ExtractRequest):
     law_text = request.lawText
@@ -81,9 +216,7 @@ Court Text:
 {law_text}
 """
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
-        text = getattr(response, "text", "")
+        text = await gemini_generate(prompt)
         
         text = text.strip()
         if text.startswith("```json"):
@@ -108,28 +241,68 @@ Court Text:
 
 
 @app.post("/api/ask")
-async def ask_question(file: UploadFile = File(None), question: str = Form(...)):
+async def ask_question(
+    file: UploadFile = File(None),
+    question: str = Form(...),
+    filenames: Optional[List[str]] = Form(None),
+    stream: bool = Form(False),
+    vector_store=Depends(get_vector_store),
+    context_packer=Depends(get_context_packer),
+    answer_cache=Depends(get_answer_cache),
+):
     """
     Revised endpoint to handle PDF upload OR Database RAG Queries.
+
+    With ``stream=true`` the answer is sent as Server-Sent Events: a
+    ``sources`` event first, then ``token`` events, then ``done``.
     """
     if file is None:
         # -------------------------------------------------------------
         # Path 1: Global RAG Search over all Legal Word Docs
         # -------------------------------------------------------------
+        if vector_store is None:
+            return {"error": "RAG search is not available: the vector store failed to load at startup."}
+
         try:
-            from app.rag.vector_store import VectorStoreManager
-            
-            vector_store = VectorStoreManager()
-            results = vector_store.search(question, n_results=10)
+            request_start = time.perf_counter()
+            # Optional scope: only these legislation files (repeat the form field per file)
+            scope = [f for f in filenames or [] if f]
+            # Article/case numbers and law names the cached answer must share
+            keys = question_keys(question)
+
+            # Near-identical question answered before over the same, unchanged chunks
+            # Retrieval is CPU-bound: keep it off the event loop
+            question_embedding = await run_in_threadpool(vector_store.embed_query, question)
+            cached = await run_in_threadpool(
+                answer_cache.lookup, question_embedding, scope, vector_store.chunks_unchanged, keys
+            )
+            if cached is not None:
+                print(
+                    f"[RAG] answer cache hit in {(time.perf_counter() - request_start) * 1000:.0f} ms "
+                    f"(saved ~{cached['llm_ms']:.0f} ms of LLM time)",
+                    flush=True,
+                )
+                if stream:
+                    return sse_response(sse_answer(
+                        single_chunk(cached["answer"]), {"sources": cached["sources"]}, request_start, "RAG"
+                    ))
+                return {"answer": cached["answer"], "sources": cached["sources"]}
+
+            # A reranker keeps fewer, better chunks than plain RRF
+            results = await run_in_threadpool(
+                vector_store.search,
+                question,
+                n_results=RERANK_TOP_N if vector_store.reranker else 10,
+                filenames=scope or None,
+            )
+            retrieval_ms = (time.perf_counter() - request_start) * 1000
             
             if not results['documents'] or not results['documents'][0]:
                 return {"answer": "لم أتمكن من العثور على أية تشريعات مرتبطة بسؤالك."}
                 
-            # Combine the chunks into a unified context string
-            context_text = "\n\n".join([
-                f"--- نص قانوني من تشريع: {meta.get('filename', 'Unknown')} ---\n{doc}"
-                for doc, meta in zip(results['documents'][0], results['metadatas'][0])
-            ])
+            # Deduplicate, merge neighbouring chunks and cap the context at the token budget
+            packed = await run_in_threadpool(context_packer.pack, results['documents'][0], results['metadatas'][0])
+            context_text = packed["context"]
             
             prompt = f"""
 أنت مستشار قانوني فلسطيني ذكي ومحترف. 
@@ -148,13 +321,40 @@ async def ask_question(file: UploadFile = File(None), question: str = Form(...))
 4. رتب إجابتك في نقاط واضحة (Bullet points) لتسهيل القراءة.
 5. أعطِ الإجابة مباشرة وفوراً، ولا تبدأ أبداً بعبارات مثل "بناءً على النصوص" أو "بصفتي مستشار" أو ختام بـ "هل تحتاج شيئاً آخر".
 """
+            chunk_hashes = {i: content_hash(d) for i, d in zip(results['ids'][0], results['documents'][0])}
+            if stream:
+                print(
+                    f"[RAG] retrieval={retrieval_ms:.0f} ms, "
+                    f"context={packed['tokens_out']}/{packed['tokens_in']} tokens",
+                    flush=True,
+                )
+
+                def remember(answer: str, llm_ms: float):
+                    answer_cache.put(question_embedding, scope, answer, packed["sources"], chunk_hashes, llm_ms, keys)
+
+                return sse_response(sse_answer(
+                    gemini_stream(prompt), {"sources": packed["sources"]}, request_start, "RAG", remember
+                ))
+
             # Using Gemini 2.5 Flash as requested
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            response = model.generate_content(prompt)
+            llm_start = time.perf_counter()
+            answer = await gemini_generate(prompt)
+            llm_ms = (time.perf_counter() - llm_start) * 1000
+
+            print(
+                f"[RAG] retrieval={retrieval_ms:.0f} ms, llm={llm_ms:.0f} ms, "
+                f"total={(time.perf_counter() - request_start) * 1000:.0f} ms, "
+                f"context={packed['tokens_out']}/{packed['tokens_in']} tokens "
+                f"({packed['tokens_in'] - packed['tokens_out']} saved)",
+                flush=True,
+            )
             
+            if answer:
+                answer_cache.put(question_embedding, scope, answer, packed["sources"], chunk_hashes, llm_ms, keys)
+
             return {
-                "answer": response.text,
-                "sources": list(set([m.get("filename") for m in results['metadatas'][0]]))
+                "answer": answer,
+                "sources": packed["sources"]
             }
         except Exception as e:
             return {"error": f"Error performing RAG search: {str(e)}"}
@@ -163,13 +363,11 @@ async def ask_question(file: UploadFile = File(None), question: str = Form(...))
         # -------------------------------------------------------------
         # Path 2: Explicit PDF Upload QA (Previous Logic)
         # -------------------------------------------------------------
-        temp_path = f"temp_{file.filename}"
-        
+        request_start = time.perf_counter()
+
         try:
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            law_text = extract_text_from_pdf(temp_path)
+            # Parse the spooled upload in place, no copy in the working directory
+            law_text = await run_in_threadpool(extract_text_from_pdf, file.file)
             
             if not law_text:
                 return {"error": "Could not extract text from the PDF file."}
@@ -205,13 +403,16 @@ async def ask_question(file: UploadFile = File(None), question: str = Form(...))
 - إن أمكن، لخّص النتيجة النهائية للحكم أو القاعدة القانونية المستخلصة.
 """
             messages = [{"role": "user", "content": prompt}]
+
+            if stream:
+                return sse_response(sse_answer(
+                    openrouter_stream(messages),
+                    {"filename": file.filename, "text_length": len(law_text)},
+                    request_start,
+                    "PDF",
+                ))
             
-            response = or_client.chat.completions.create(
-                model=OR_MODEL,
-                messages=messages
-            )
-            
-            answer_text = response.choices[0].message.content
+            answer_text = await openrouter_chat(messages)
             
             return {
                 "answer": answer_text,
@@ -219,15 +420,34 @@ async def ask_question(file: UploadFile = File(None), question: str = Form(...))
                 "text_length": len(law_text)
             }
 
+        except PDFTooLargeError as e:
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Error processing PDF: {str(e)}"}
-        
-        finally:
-            if os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except:
-                    pass
+
+
+@app.get("/api/metrics")
+def get_metrics(
+    vector_store=Depends(get_vector_store),
+    context_packer=Depends(get_context_packer),
+    answer_cache=Depends(get_answer_cache),
+):
+    """Cache and latency counters for this worker process."""
+    metrics = {}
+    if vector_store is not None:
+        metrics["query_embedding_cache"] = vector_store.query_cache.stats()
+        if vector_store.reranker is not None:
+            metrics["rerank_score_cache"] = vector_store.reranker.stats()
+    if context_packer is not None:
+        metrics["context_packer"] = context_packer.stats()
+    metrics["answer_cache"] = answer_cache.stats()
+    metrics["pdf_text_cache"] = pdf_text_cache.stats()
+
+    from app.chat_utils import sql_cache, sql_router, text_to_sql_stats
+    metrics["text_to_sql"] = text_to_sql_stats.stats()
+    metrics["text_to_sql_cache"] = sql_cache.stats()
+    metrics["text_to_sql_providers"] = sql_router.stats()
+    return metrics
 
 
 @app.post("/api/db-query")
@@ -247,22 +467,25 @@ async def query_database(request: DbQueryRequest):
         # Path 1: Natural Language Query -> LLM -> SQL
         # ---------------------------------------------------------
         try:
-            from app.chat_utils import get_sql_from_llm, execute_sql
+            from app.chat_utils import get_sql, execute_sql, remember_sql
             
             print(f"[INFO] Processing NLQ: {request.query}")
             
             # 1. Generate SQL
-            sql = get_sql_from_llm(request.query)
+            sql, params, sql_path = await run_in_threadpool(get_sql, request.query)
             if not sql:
                 return {"answer": "Could not generate a database query for your question. (Check API Key or Logs)"}
             
-            print(f"[INFO] Generated SQL: {sql}")
+            print(f"[INFO] Generated SQL: {sql} {params or ''}")
             
             # 2. Execute & Filter
-            results = execute_sql(sql, request.query)
+            results = await run_in_threadpool(execute_sql, sql, request.query, params)
             
             if "error" in results:
                 return {"answer": f"Database error: {results['error']}"}
+
+            if sql_path == "llm":
+                remember_sql(request.query, sql)
             
             if results.get("count", 0) == 0:
                 answer_text = "No records found matching your question."
@@ -316,6 +539,8 @@ async def query_database(request: DbQueryRequest):
                 "sql": results.get("sql", sql),
                 "count": results.get("count", len(mapped_data))
             }
+            if params:
+                response_data["params"] = params
             
             if summary:
                 response_data["summary"] = summary
@@ -0,0 +1,175 @@
+"""
+Content-addressed cache of extracted PDF text.
+
+Users upload the same judgment PDFs to /api/ask again and again with new
+questions, and the batch scripts re-read the same folders on every run.
+PyPDF2 parsing is the slow part, so the extracted text and the offset of
+each page in it are cached under the SHA-256 of the PDF bytes. A renamed
+copy of a file hits the cache. An edited file misses it.
+
+The in-process tier is an LRU bounded by the total size of the cached text.
+An optional directory tier (one JSON file per PDF) survives restarts and is
+shared by every process on the host.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, List, Optional
+
+PDF_TEXT_CACHE_BYTES = int(os.getenv("PDF_TEXT_CACHE_BYTES", str(64 * 1024 * 1024)))
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", "")
+PDF_TEXT_CACHE_DISK_BYTES = int(os.getenv("PDF_TEXT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+
+CACHE_VERSION = 1
+# Disk usage is checked against the limit every this many writes
+_PRUNE_EVERY = 64
+
+
+def stream_sha256(stream: BinaryIO) -> str:
+    """SHA-256 of the rest of a seekable stream; the position is restored."""
+    position = stream.tell()
+    digest = hashlib.sha256()
+    while chunk := stream.read(1024 * 1024):
+        digest.update(chunk)
+    stream.seek(position)
+    return digest.hexdigest()
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return len(entry["text"]) * 2 + len(entry["page_offsets"]) * 8
+
+
+class PDFTextCache:
+    def __init__(
+        self,
+        max_bytes: int = PDF_TEXT_CACHE_BYTES,
+        disk_dir: Optional[str] = PDF_TEXT_CACHE_DIR or None,
+        max_disk_bytes: int = PDF_TEXT_CACHE_DISK_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """``{"text", "page_offsets"}`` extracted from the PDF with this SHA-256, or None."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(digest)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(digest, entry)
+            self.disk_hits += 1
+            return entry
+
+    def put(self, digest: str, text: str, page_offsets: List[int]):
+        entry = {"text": text, "page_offsets": list(page_offsets)}
+        with self._lock:
+            self._remember(digest, entry)
+        self._write_disk(digest, entry)
+
+    def _remember(self, digest: str, entry: Dict[str, Any]):
+        previous = self._entries.pop(digest, None)
+        if previous is not None:
+            self._size -= _entry_size(previous)
+        size = _entry_size(entry)
+        # A text bigger than the whole budget is not kept in memory
+        if size > self.max_bytes:
+            return
+        self._entries[digest] = entry
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= _entry_size(evicted)
+
+    def _disk_path(self, digest: str) -> str:
+        return os.path.join(self.disk_dir, digest[:2], f"{digest}.json")
+
+    def _read_disk(self, digest: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(digest)
+        try:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != CACHE_VERSION:
+            return None
+        try:
+            # Keep recently used files out of the next prune
+            os.utime(path)
+        except OSError:
+            pass
+        return {"text": payload["text"], "page_offsets": payload["page_offsets"]}
+
+    def _write_disk(self, digest: str, entry: Dict[str, Any]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(digest)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CACHE_VERSION, **entry}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[PDF CACHE] Disk tier write failed: {e}")
+            return
+        with self._lock:
+            self._disk_puts += 1
+            prune = self._disk_puts % _PRUNE_EVERY == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete the least recently used files until the directory fits its budget."""
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -1,27 +1,141 @@
 import PyPDF2
+import io
 import os
-from typing import Optional
+import tempfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
-def extract_text_from_pdf(pdf_path: str) -> Optional[str]:
+from app.pdf_cache import PDFTextCache, stream_sha256
+
+# Uploads larger than this are rejected before parsing
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+# Non-seekable streams are buffered in memory up to this size, then in a unique temp file
+PDF_SPOOL_THRESHOLD = int(os.getenv("PDF_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+
+PdfSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+# Shared by every caller in the process; see app/pdf_cache.py for the env settings
+pdf_text_cache = PDFTextCache()
+
+
+class PDFTooLargeError(ValueError):
+    pass
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size - position
+
+
+@contextmanager
+def open_pdf_source(
+    source: PdfSource,
+    max_bytes: int = PDF_MAX_BYTES,
+    spool_threshold: int = PDF_SPOOL_THRESHOLD,
+) -> Iterator[BinaryIO]:
+    """Seekable binary stream over a path, bytes-like object or file-like object.
+
+    Bytes and seekable streams (such as the spooled file behind a FastAPI
+    ``UploadFile``) are read in place. Other streams are copied into a
+    ``SpooledTemporaryFile`` that only goes to disk past ``spool_threshold``.
+    ``max_bytes`` applies to everything but paths.
     """
-    Extract text content from a PDF file using PyPDF2.
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            yield file
+        return
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        if len(source) > max_bytes:
+            raise PDFTooLargeError(f"PDF is larger than {max_bytes} bytes")
+        yield io.BytesIO(source)
+        return
+
+    if source.seekable():
+        if _stream_size(source) > max_bytes:
+            raise PDFTooLargeError(f"PDF is larger than {max_bytes} bytes")
+        yield source
+        return
+
+    with tempfile.SpooledTemporaryFile(max_size=spool_threshold) as buffer:
+        size = 0
+        while chunk := source.read(1024 * 1024):
+            size += len(chunk)
+            if size > max_bytes:
+                raise PDFTooLargeError(f"PDF is larger than {max_bytes} bytes")
+            buffer.write(chunk)
+        buffer.seek(0)
+        yield buffer
+
+
+def _parse_pdf(file: BinaryIO) -> Tuple[str, List[int]]:
+    """Text of every page, and the offset in that text where each page starts."""
+    text = ""
+    starts = []
+    pdf_reader = PyPDF2.PdfReader(file)
+    for page in pdf_reader.pages:
+        starts.append(len(text))
+        page_text = page.extract_text()
+        if page_text:
+            text += page_text + "\n"
+
+    stripped = text.strip()
+    lead = len(text) - len(text.lstrip())
+    return stripped, [min(max(start - lead, 0), len(stripped)) for start in starts]
+
+
+def extract_pdf_pages(
+    source: PdfSource,
+    max_bytes: int = PDF_MAX_BYTES,
+    cache: Optional[PDFTextCache] = pdf_text_cache,
+) -> Optional[Dict[str, Any]]:
     """
+    Extract ``{"text", "page_offsets", "sha256"}`` from a PDF using PyPDF2.
+
+    ``page_offsets[i]`` is where page i starts in ``text``. Results are
+    cached under the SHA-256 of the PDF bytes, so the same file is only
+    parsed once; pass ``cache=None`` to always parse. Returns None when the
+    source cannot be opened or no text could be extracted.
+    """
+    label = source if isinstance(source, str) else getattr(source, "name", "<in-memory PDF>")
     try:
-        text = ""
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        
-        if not text.strip():
-            return None
-            
-        return text.strip()
+        with open_pdf_source(source, max_bytes=max_bytes) as file:
+            digest = stream_sha256(file) if cache is not None else None
+            cached = cache.get(digest) if cache is not None else None
+            if cached is not None:
+                text, page_offsets = cached["text"], cached["page_offsets"]
+            else:
+                text, page_offsets = _parse_pdf(file)
+                if cache is not None:
+                    cache.put(digest, text, page_offsets)
+    except PDFTooLargeError:
+        raise
     except Exception as e:
-        print(f"Error extracting text from {pdf_path}: {str(e)}")
+        # Missing or unreadable files included, as when every caller opened the path itself
+        print(f"Error extracting text from {label}: {str(e)}")
+        return None
+
+    if not text:
         return None
+    return {"text": text, "page_offsets": page_offsets, "sha256": digest}
+
+
+def extract_text_from_pdf(
+    source: PdfSource,
+    max_bytes: int = PDF_MAX_BYTES,
+    cache: Optional[PDFTextCache] = pdf_text_cache,
+) -> Optional[str]:
+    """
+    Extract text content from a PDF using PyPDF2.
+
+    ``source`` is a file path, the PDF bytes, or a binary file-like object.
+    Raises PDFTooLargeError when an in-memory or streamed PDF exceeds ``max_bytes``.
+    """
+    result = extract_pdf_pages(source, max_bytes=max_bytes, cache=cache)
+    return result["text"] if result else None
 
 
 def process_pdfs_in_folder(folder_path: str) -> dict:
@@ -0,0 +1,173 @@
+"""
+Semantic answer cache for the RAG path of /api/ask.
+
+A new question is embedded anyway for retrieval. When its nearest cached
+question (cosine similarity over the normalised embeddings) is above
+``RAG_ANSWER_CACHE_THRESHOLD`` and was asked with the same search scope, the
+cached answer is returned and the Gemini call is skipped.
+
+Questions that differ only in an article or case number ("المادة 152" vs
+"المادة 153"), or in the law they name, embed almost identically. So each
+entry also carries the question's key terms (see ``question_keys``), and a
+hit requires the same ones.
+
+Each entry records the chunks its answer was grounded on, with a hash of
+their text. On a hit the caller checks them against the current store. If
+a chunk was deleted or re-ingested with different text, the entry is dropped
+and the question goes through the normal pipeline.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.rag.embedding_cache import normalize_query
+
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.96"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "86400"))
+
+
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+_FOLD = str.maketrans("أإآةى", "اااهي")
+_NUMBER = re.compile(r'\d+(?:\s*/\s*\d+)*')
+# "قانون العمل", "نظام الخدمة المدنية": up to two words naming the law
+_LAW_REF = re.compile(r'(?:قانون|نظام|مرسوم|لائحه)(?:\s+(?!رقم\b)[^\s\d؟?]+){1,2}')
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def question_keys(question: str) -> Tuple[str, ...]:
+    """Numbers and law references of a question, which a cached answer must share."""
+    text = normalize_query(question).translate(_DIGITS).translate(_FOLD)
+    numbers = {re.sub(r'\s+', '', n) for n in _NUMBER.findall(text)}
+    laws = {m.group(0) for m in _LAW_REF.finditer(text)}
+    return tuple(sorted(numbers | laws))
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # Fixed-capacity slots: row i of _vectors belongs to _entries[i]
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._last_used = np.zeros(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.saved_llm_ms = 0.0
+
+    def lookup(
+        self,
+        embedding: np.ndarray,
+        scope: Sequence[str],
+        is_valid: Callable[[Dict[str, str]], bool],
+        keys: Sequence[str] = (),
+    ) -> Optional[Dict[str, Any]]:
+        """Cached answer of the most similar question, or None.
+
+        ``keys`` (from ``question_keys``) must equal the cached question's.
+        ``is_valid`` receives the entry's ``{chunk_id: content_hash}`` and
+        says whether those chunks are still in the store unchanged.
+        """
+        if self.max_entries <= 0:
+            return None
+        now = time.time()
+        scope = tuple(sorted(scope))
+        keys = tuple(sorted(keys))
+        with self._lock:
+            slot = self._nearest(np.asarray(embedding, dtype=np.float32), scope, keys, now)
+            entry = self._entries[slot] if slot is not None else None
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        valid = is_valid(entry["chunks"])
+        with self._lock:
+            if not valid:
+                if self._entries[slot] is entry:
+                    self._entries[slot] = None
+                self.invalidated += 1
+                self.misses += 1
+                return None
+            self._last_used[slot] = now
+            self.hits += 1
+            self.saved_llm_ms += entry["llm_ms"]
+        return entry
+
+    def _nearest(self, embedding: np.ndarray, scope: tuple, keys: tuple, now: float) -> Optional[int]:
+        if self._vectors is None:
+            return None
+        similarity = self._vectors @ embedding
+        for slot in np.argsort(-similarity):
+            if similarity[slot] < self.threshold:
+                return None
+            entry = self._entries[slot]
+            if entry is None:
+                continue
+            if now - entry["created"] > self.ttl_seconds:
+                self._entries[slot] = None
+                continue
+            if entry["scope"] == scope and entry["keys"] == keys:
+                return int(slot)
+        return None
+
+    def put(
+        self,
+        embedding: np.ndarray,
+        scope: Sequence[str],
+        answer: str,
+        sources: List[str],
+        chunks: Dict[str, str],
+        llm_ms: float,
+        keys: Sequence[str] = (),
+    ):
+        if self.max_entries <= 0:
+            return
+        embedding = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+            free = [i for i, e in enumerate(self._entries) if e is None]
+            # Evict the least recently used entry when full
+            slot = free[0] if free else int(np.argmin(self._last_used))
+            self._vectors[slot] = embedding
+            self._last_used[slot] = now
+            self._entries[slot] = {
+                "scope": tuple(sorted(scope)),
+                "keys": tuple(sorted(keys)),
+                "answer": answer,
+                "sources": sources,
+                "chunks": chunks,
+                "llm_ms": llm_ms,
+                "created": now,
+            }
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(e is not None for e in self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidated": self.invalidated,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_llm_ms": round(self.saved_llm_ms, 1),
+            }
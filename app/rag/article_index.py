@@ -0,0 +1,159 @@
+"""
+Exact article-number index: (law filename, article number) -> chunk ids.
+
+Questions such as "ما نص المادة 152 من قانون العمل" name the article they
+want. When the index can tell which law is meant, ``VectorStoreManager.search``
+returns that article's chunks directly, without encoding the question or
+scoring BM25.
+
+The index is built from the ``article_number`` chunk metadata written at
+ingestion time and is kept in step with the collection alongside the BM25
+index. It is persisted as JSON next to the Chroma DB, with the fingerprint of
+the ids it was built from so a stale file is rebuilt instead of served.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+INDEX_VERSION = 1
+
+# Western, Arabic-Indic and Extended Arabic-Indic digits
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+_ARTICLE_REF = re.compile(r'(?:المادة|مادة|الماده|ماده)\s*(?:رقم\s*)?\(?\s*([\d٠-٩۰-۹]+)\s*\)?')
+# The question names a law ("من قانون العمل", "نظام ...", "المرسوم ...")
+_LAW_REF = re.compile(r'(?:قانون|نظام|مرسوم|لائحة|لائحه)')
+
+
+def parse_article_number(text: str) -> Optional[int]:
+    """Article number of an article header or reference such as "المادة (١٥٢)"."""
+    match = _ARTICLE_REF.search(text)
+    return int(match.group(1).translate(_DIGITS)) if match else None
+
+
+class ArticleIndex:
+    def __init__(self):
+        # filename -> article number -> [[chunk_index, chunk_id], ...] sorted by chunk_index
+        self._articles: Dict[str, Dict[int, List[List[Any]]]] = {}
+        self._positions: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.fingerprint = ""
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]):
+        """Index (or re-index) chunks by their ``article_number`` metadata."""
+        with self._lock:
+            self._remove(ids)
+            for chunk_id, meta in zip(ids, metadatas):
+                meta = meta or {}
+                number = meta.get("article_number")
+                if number is None or meta.get("filename") is None:
+                    continue
+                entries = self._articles.setdefault(meta["filename"], {}).setdefault(int(number), [])
+                entries.append([meta.get("chunk_index") or 0, chunk_id])
+                entries.sort()
+                self._positions[chunk_id] = (meta["filename"], int(number))
+
+    def remove(self, ids: Sequence[str]):
+        with self._lock:
+            self._remove(ids)
+
+    def _remove(self, ids: Sequence[str]):
+        for chunk_id in ids:
+            position = self._positions.pop(chunk_id, None)
+            if position is None:
+                continue
+            filename, number = position
+            entries = [e for e in self._articles[filename][number] if e[1] != chunk_id]
+            if entries:
+                self._articles[filename][number] = entries
+            else:
+                del self._articles[filename][number]
+                if not self._articles[filename]:
+                    del self._articles[filename]
+
+    def rebuild(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]):
+        with self._lock:
+            self._articles, self._positions = {}, {}
+        self.add(ids, metadatas)
+
+    def resolve(
+        self,
+        question: str,
+        tokenize: Callable[[str], List[str]],
+        filenames: Optional[Sequence[str]] = None,
+    ) -> Optional[List[str]]:
+        """Chunk ids of the single article the question asks for, or None.
+
+        The law is taken from the question's overlap with the filenames that
+        contain that article number (optionally only among ``filenames``).
+        A question that names a law is checked against the name even when only
+        one file has the article, so "المادة 5 من قانون التجارة" is not
+        answered from another law. Ambiguous questions return None so the
+        caller falls back to hybrid search.
+        """
+        numbers = {int(n.translate(_DIGITS)) for n in _ARTICLE_REF.findall(question)}
+        if len(numbers) != 1:
+            return None
+        number = numbers.pop()
+        with self._lock:
+            candidates = {
+                f: arts[number] for f, arts in self._articles.items()
+                if number in arts and (not filenames or f in filenames)
+            }
+        if not candidates:
+            return None
+        if len(candidates) > 1 or _LAW_REF.search(question):
+            words = set(tokenize(_ARTICLE_REF.sub(" ", question)))
+            scored = []
+            for filename in candidates:
+                name_words = set(tokenize(re.sub(r'[_\-.]+', ' ', os.path.splitext(filename)[0])))
+                # "قانون" alone says nothing about which law
+                name_words = {w for w in name_words if not _LAW_REF.fullmatch(w)}
+                scored.append((len(words & name_words) / max(len(name_words), 1), filename))
+            scored.sort(reverse=True)
+            # Require a clear winner that matches at least half of the law's name
+            if scored[0][0] < 0.5 or (len(scored) > 1 and scored[0][0] == scored[1][0]):
+                return None
+            candidates = {scored[0][1]: candidates[scored[0][1]]}
+        (entries,) = candidates.values()
+        return [chunk_id for _, chunk_id in entries]
+
+    def save(self, path: str, fingerprint: str):
+        with self._lock:
+            payload = {
+                "version": INDEX_VERSION,
+                "fingerprint": fingerprint,
+                "articles": {
+                    filename: {str(n): entries for n, entries in arts.items()}
+                    for filename, arts in self._articles.items()
+                },
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ArticleIndex"]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != INDEX_VERSION:
+            return None
+        index = cls()
+        index.fingerprint = payload.get("fingerprint", "")
+        for filename, arts in payload.get("articles", {}).items():
+            for number, entries in arts.items():
+                index._articles.setdefault(filename, {})[int(number)] = entries
+                for _, chunk_id in entries:
+                    index._positions[chunk_id] = (filename, int(number))
+        return index
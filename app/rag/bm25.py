@@ -0,0 +1,566 @@
+"""
+Sparse-matrix BM25 index.
+
+Produces the same scores as ``rank_bm25.BM25Okapi`` (same k1 / b / epsilon and
+the same negative-IDF floor), but the corpus is held as SciPy CSR
+term-document matrices: row ``t`` is the postings list of term ``t``. A query
+only touches the postings of its own terms, and scoring is a single sparse
+matrix-vector product per segment instead of a Python loop over every document.
+
+The index is incremental. Every ``add`` appends a new segment and upserted or
+removed ids are tombstoned, while document frequencies and length statistics
+are updated in place. ``compacted`` folds all segments back into one. The part
+added since the last ``rebase`` is the delta that callers persist on its own.
+
+A compacted index is written with ``save`` as a directory of ``.npy`` columns
+(postings, doc lengths, and id / text / metadata blobs with byte offsets).
+``load`` opens them with ``np.memmap``, so several worker processes share one
+copy through the OS page cache. The manifest records the format version and a
+fingerprint of the indexed ids, so stale or foreign files are rejected.
+"""
+
+import copy
+import hashlib
+import itertools
+import json
+import os
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+FORMAT_VERSION = 1
+_HASH_MASK = (1 << 64) - 1
+
+
+def _id_hash(doc_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def corpus_fingerprint(ids: Sequence[str]) -> str:
+    """Order-independent fingerprint of a set of chunk ids (count + summed hashes)."""
+    total = 0
+    for doc_id in ids:
+        total = (total + _id_hash(doc_id)) & _HASH_MASK
+    return f"{len(ids)}:{total:016x}"
+
+
+def _encode_column(values, encode) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [encode(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class _BlobColumn:
+    """Memory-mapped string column (blob + byte offsets) with an in-heap overlay.
+
+    Values are decoded on access. Tombstones and appended slots live in the
+    overlay, so the mapped files are never written to.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, decode=None):
+        self._blob = blob
+        self._offsets = offsets
+        self._decode = decode
+        self._base = len(offsets) - 1
+        self._overlay: Dict[int, Any] = {}
+        self._tail: List[Any] = []
+
+    def __len__(self) -> int:
+        return self._base + len(self._tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if i >= self._base:
+            return self._tail[i - self._base]
+        if i in self._overlay:
+            return self._overlay[i]
+        raw = bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+        return self._decode(raw) if self._decode else raw
+
+    def __setitem__(self, i, value):
+        i = int(i)
+        if i >= self._base:
+            self._tail[i - self._base] = value
+        else:
+            self._overlay[i] = value
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def extend(self, values):
+        self._tail.extend(values)
+
+    def copy(self) -> "_BlobColumn":
+        column = copy.copy(self)
+        column._overlay = dict(self._overlay)
+        column._tail = list(self._tail)
+        return column
+
+
+class SparseBM25:
+    def __init__(
+        self,
+        corpus: Sequence[List[str]],
+        ids: Optional[Sequence[str]] = None,
+        docs: Optional[Sequence[str]] = None,
+        metas: Optional[Sequence[Dict[str, Any]]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+        self.df = np.zeros(0, dtype=np.int64)
+
+        # Slot-aligned document table; tombstoned slots hold None
+        self.ids: List[Optional[str]] = []
+        self.docs: List[Optional[str]] = []
+        self.metas: List[Optional[Dict[str, Any]]] = []
+        self.doc_len = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=bool)
+        self._id_to_slot: Optional[Dict[str, int]] = {}
+        # (first slot, term-major CSR of shape (vocab size at build time, docs in segment))
+        self._segments: List[Tuple[int, sparse.csr_matrix]] = []
+        # metadata field -> value -> slots, built on first filtered query
+        self._field_slots: Dict[str, Dict[Any, List[int]]] = {}
+
+        self.corpus_size = 0
+        self.total_len = 0.0
+        self._id_hash_sum = 0
+        self.generation = 0
+        self._stats_dirty = True
+
+        # Boundary of the last persisted base; everything after it is the delta
+        self.base_id = uuid.uuid4().hex
+        self.base_slots = 0
+        self.base_vocab = 0
+
+        if ids is None:
+            ids = [str(i) for i in range(len(corpus))]
+        if len(corpus):
+            self.add(ids, corpus, docs, metas)
+
+    def __len__(self) -> int:
+        return self.corpus_size
+
+    @property
+    def id_to_slot(self) -> Dict[str, int]:
+        # Built lazily: a loaded index only needs it once it is mutated
+        if self._id_to_slot is None:
+            self._id_to_slot = {doc_id: slot for slot, doc_id in enumerate(self.ids) if doc_id is not None}
+        return self._id_to_slot
+
+    def slot_mask(self, field: str, values: Sequence[Any]) -> np.ndarray:
+        """Boolean mask of the live slots whose metadata ``field`` is one of ``values``."""
+        index = self._field_slots.get(field)
+        if index is None:
+            index = {}
+            for slot, meta in enumerate(self.metas):
+                if meta is not None and field in meta:
+                    index.setdefault(meta[field], []).append(slot)
+            self._field_slots[field] = index
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for value in values:
+            mask[index.get(value, [])] = True
+        return mask & self.alive
+
+    @property
+    def fingerprint(self) -> str:
+        """Same value as ``corpus_fingerprint`` over the live ids."""
+        return f"{self.corpus_size}:{self._id_hash_sum:016x}"
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+    def add(
+        self,
+        ids: Sequence[str],
+        tokenized: Sequence[List[str]],
+        docs: Optional[Sequence[str]] = None,
+        metas: Optional[Sequence[Dict[str, Any]]] = None,
+    ):
+        """Append documents as a new segment; ids already indexed are replaced."""
+        self.remove([i for i in ids if i in self.id_to_slot])
+
+        indptr = [0]
+        indices: List[int] = []
+        data: List[int] = []
+        lengths: List[int] = []
+        for tokens in tokenized:
+            for term, freq in Counter(tokens).items():
+                indices.append(self.vocab.setdefault(term, len(self.vocab)))
+                data.append(freq)
+            indptr.append(len(indices))
+            lengths.append(len(tokens))
+
+        doc_term = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(lengths), len(self.vocab)),
+        )
+        self._append_segment(
+            doc_term.T.tocsr(),
+            list(ids),
+            list(docs) if docs is not None else [None] * len(lengths),
+            list(metas) if metas is not None else [None] * len(lengths),
+            np.asarray(lengths, dtype=np.float64),
+            np.ones(len(lengths), dtype=bool),
+        )
+
+    def remove(self, ids: Sequence[str]):
+        """Tombstone documents and take their terms out of the statistics."""
+        id_to_slot = self.id_to_slot
+        removed = [i for i in ids if i in id_to_slot]
+        slots = np.asarray([id_to_slot.pop(i) for i in removed], dtype=np.int64)
+        if slots.size == 0:
+            return
+        for doc_id in removed:
+            self._id_hash_sum = (self._id_hash_sum - _id_hash(doc_id)) & _HASH_MASK
+
+        for start, tf in self._segments:
+            local = slots[(slots >= start) & (slots < start + tf.shape[1])] - start
+            if local.size == 0:
+                continue
+            hits = np.flatnonzero(np.isin(tf.indices, local))
+            terms = np.searchsorted(tf.indptr, hits, side="right") - 1
+            np.subtract.at(self.df, terms, 1)
+
+        self.alive[slots] = False
+        self.corpus_size -= int(slots.size)
+        self.total_len -= float(self.doc_len[slots].sum())
+        for slot in slots:
+            self.ids[slot] = None
+            self.docs[slot] = None
+            self.metas[slot] = None
+        self._touch()
+
+    def _append_segment(self, tf, ids, docs, metas, doc_len, alive):
+        start = len(self.ids)
+        self._segments.append((start, tf))
+        self.ids.extend(ids)
+        self.docs.extend(docs)
+        self.metas.extend(metas)
+        id_to_slot = self.id_to_slot
+        for offset, doc_id in enumerate(ids):
+            if alive[offset]:
+                id_to_slot[doc_id] = start + offset
+                self._id_hash_sum = (self._id_hash_sum + _id_hash(doc_id)) & _HASH_MASK
+        # Removed slots stay listed; ``slot_mask`` drops them through ``alive``
+        for field, index in self._field_slots.items():
+            for offset, meta in enumerate(metas):
+                if alive[offset] and meta is not None and field in meta:
+                    index.setdefault(meta[field], []).append(start + offset)
+
+        self.doc_len = np.concatenate([self.doc_len, doc_len])
+        self.alive = np.concatenate([self.alive, alive])
+        self.corpus_size += int(alive.sum())
+        self.total_len += float(doc_len[alive].sum())
+
+        if self.df.size < len(self.vocab):
+            self.df = np.concatenate([self.df, np.zeros(len(self.vocab) - self.df.size, dtype=np.int64)])
+        if alive.all():
+            self.df[:tf.shape[0]] += np.diff(tf.indptr)
+        else:
+            rows = np.repeat(np.arange(tf.shape[0]), np.diff(tf.indptr))
+            self.df[:tf.shape[0]] += np.bincount(rows[alive[tf.indices]], minlength=tf.shape[0])
+        self._touch()
+
+    def _touch(self):
+        self.generation += 1
+        self._stats_dirty = True
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _refresh_stats(self):
+        """Recompute IDF (O(vocab)) and length normalisation (O(docs)) after a change."""
+        if not self._stats_dirty:
+            return
+        self.avgdl = self.total_len / self.corpus_size if self.corpus_size else 0.0
+
+        # Okapi IDF with rank_bm25's floor: negative values become epsilon * mean IDF
+        self.idf = np.zeros(self.df.size)
+        present = self.df > 0
+        if present.any():
+            df = self.df[present]
+            idf = np.log(self.corpus_size - df + 0.5) - np.log(df + 0.5)
+            idf[idf < 0] = self.epsilon * idf.mean()
+            self.idf[present] = idf
+
+        if self.avgdl > 0:
+            self.norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        else:
+            self.norm = np.full(self.doc_len.size, self.k1 * (1 - self.b))
+        self._stats_dirty = False
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """BM25 score of every slot for a tokenized query (repeated tokens count twice)."""
+        self._refresh_stats()
+        scores = np.zeros(len(self.ids))
+        counts = Counter(t for t in query if t in self.vocab)
+        if not counts or self.corpus_size == 0:
+            return scores
+
+        term_ids = np.fromiter((self.vocab[t] for t in counts), dtype=np.int64, count=len(counts))
+        weights = self.idf[term_ids] * np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+
+        for start, tf in self._segments:
+            in_segment = term_ids < tf.shape[0]
+            if not in_segment.any():
+                continue
+            postings = tf[term_ids[in_segment]]
+            if postings.nnz == 0:
+                continue
+            freq = postings.data.astype(np.float64)
+            saturated = sparse.csr_matrix(
+                (freq * (self.k1 + 1) / (freq + self.norm[start + postings.indices]), postings.indices, postings.indptr),
+                shape=postings.shape,
+            )
+            scores[start:start + tf.shape[1]] += saturated.T.dot(weights[in_segment])
+
+        scores[~self.alive] = 0.0
+        return scores
+
+    def get_scores_batch(
+        self, queries: Sequence[List[str]], allowed: Optional[np.ndarray] = None
+    ) -> sparse.csr_matrix:
+        """Scores of several queries at once as a sparse (queries x slots) matrix.
+
+        The queries' term weights form one sparse matrix, so each segment is
+        scored for all queries with a single sparse-sparse product. With an
+        ``allowed`` slot mask (see ``slot_mask``), postings of other slots are
+        dropped before scoring.
+        """
+        self._refresh_stats()
+        n_slots = len(self.ids)
+        columns: Dict[str, int] = {}
+        rows, cols, counts = [], [], []
+        for qi, query in enumerate(queries):
+            for term, count in Counter(t for t in query if t in self.vocab).items():
+                rows.append(qi)
+                cols.append(columns.setdefault(term, len(columns)))
+                counts.append(count)
+        if not columns or self.corpus_size == 0:
+            return sparse.csr_matrix((len(queries), n_slots))
+
+        term_ids = np.fromiter((self.vocab[t] for t in columns), dtype=np.int64, count=len(columns))
+        cols = np.asarray(cols, dtype=np.int64)
+        weights = sparse.csr_matrix(
+            (self.idf[term_ids[cols]] * np.asarray(counts, dtype=np.float64), (rows, cols)),
+            shape=(len(queries), len(columns)),
+        )
+
+        blocks = []
+        for start, tf in self._segments:
+            in_segment = np.flatnonzero(term_ids < tf.shape[0])
+            postings = tf[term_ids[in_segment]]
+            if allowed is not None:
+                keep = allowed[start + postings.indices]
+                rows = np.repeat(np.arange(postings.shape[0]), np.diff(postings.indptr))[keep]
+                postings = sparse.csr_matrix(
+                    (postings.data[keep], (rows, postings.indices[keep])), shape=postings.shape
+                )
+            freq = postings.data.astype(np.float64)
+            saturated = sparse.csr_matrix(
+                (freq * (self.k1 + 1) / (freq + self.norm[start + postings.indices]), postings.indices, postings.indptr),
+                shape=postings.shape,
+            )
+            blocks.append(weights[:, in_segment] @ saturated)
+
+        scores = sparse.hstack(blocks, format="csr")
+        # Zero out tombstoned (or filtered out) slots, then drop the explicit zeros
+        visible = self.alive if allowed is None else self.alive & allowed
+        scores = sparse.csr_matrix(scores.multiply(visible[np.newaxis, :].astype(np.float64)))
+        scores.eliminate_zeros()
+        return scores
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the ``k`` highest scores, best first, without a full sort."""
+        k = min(k, scores.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        return idx[np.argsort(-scores[idx], kind="stable")]
+
+    # ------------------------------------------------------------------
+    # Compaction & delta persistence
+    # ------------------------------------------------------------------
+    def is_compact(self) -> bool:
+        return len(self._segments) <= 1 and self.corpus_size == len(self.ids)
+
+    def needs_compaction(self, max_segments: int = 8, max_dead_ratio: float = 0.2) -> bool:
+        dead = len(self.ids) - self.corpus_size
+        return len(self._segments) > max_segments or dead > max_dead_ratio * max(len(self.ids), 1)
+
+    def snapshot(self) -> "SparseBM25":
+        """Copy of the mutable containers, so compaction can run without holding a lock."""
+        snap = copy.copy(self)
+        snap.vocab = dict(self.vocab)
+        snap.ids, snap.docs, snap.metas = self.ids.copy(), self.docs.copy(), self.metas.copy()
+        snap.alive, snap.df = self.alive.copy(), self.df.copy()
+        snap._segments = list(self._segments)
+        snap._id_to_slot = dict(self._id_to_slot) if self._id_to_slot is not None else None
+        snap._field_slots = {}
+        return snap
+
+    def compacted(self) -> "SparseBM25":
+        """Single-segment copy without tombstones or terms that no longer occur."""
+        vocab_size = len(self.vocab)
+        parts = []
+        for _, tf in self._segments:
+            doc_major = tf.T.tocsr()
+            parts.append(sparse.csr_matrix(
+                (doc_major.data, doc_major.indices, doc_major.indptr), shape=(doc_major.shape[0], vocab_size)
+            ))
+        live = np.flatnonzero(self.alive)
+        keep_terms = np.flatnonzero(self.df > 0)
+        doc_term = sparse.vstack(parts, format="csr")[live][:, keep_terms] if parts else sparse.csr_matrix((0, 0))
+
+        # Term ids are handed out in insertion order, so the dict order is the id order
+        terms_by_id = list(self.vocab)
+
+        fresh = SparseBM25([], k1=self.k1, b=self.b, epsilon=self.epsilon)
+        fresh.vocab = {terms_by_id[old]: new for new, old in enumerate(keep_terms)}
+        fresh._append_segment(
+            doc_term.T.tocsr(),
+            [self.ids[s] for s in live],
+            [self.docs[s] for s in live],
+            [self.metas[s] for s in live],
+            self.doc_len[live],
+            np.ones(live.size, dtype=bool),
+        )
+        return fresh
+
+    def rebase(self):
+        """Mark the current state as the persisted base: the delta becomes empty."""
+        self.base_id = uuid.uuid4().hex
+        self.base_slots = len(self.ids)
+        self.base_vocab = len(self.vocab)
+
+    def delta_state(self) -> Dict[str, Any]:
+        """Everything that changed since the last ``rebase``, for the delta file."""
+        return {
+            "base_id": self.base_id,
+            "base_slots": self.base_slots,
+            "vocab_tail": list(itertools.islice(self.vocab, self.base_vocab, None)),
+            "dead_base_slots": np.flatnonzero(~self.alive[:self.base_slots]),
+            "segments": [(start, tf) for start, tf in self._segments if start >= self.base_slots],
+            "ids": self.ids[self.base_slots:],
+            "docs": self.docs[self.base_slots:],
+            "metas": self.metas[self.base_slots:],
+            "doc_len": self.doc_len[self.base_slots:],
+            "alive": self.alive[self.base_slots:],
+        }
+
+    def apply_delta(self, delta: Dict[str, Any]):
+        """Replay a delta written by ``delta_state`` on top of the base it was taken from."""
+        if delta["base_id"] != self.base_id or delta["base_slots"] != len(self.ids):
+            raise ValueError("BM25 delta does not belong to this base")
+
+        for term in delta["vocab_tail"]:
+            self.vocab[term] = len(self.vocab)
+        self.remove([self.ids[s] for s in delta["dead_base_slots"] if self.ids[s] is not None])
+
+        base = self.base_slots
+        for start, tf in delta["segments"]:
+            lo, hi = start - base, start - base + tf.shape[1]
+            self._append_segment(
+                tf, delta["ids"][lo:hi], delta["docs"][lo:hi], delta["metas"][lo:hi],
+                delta["doc_len"][lo:hi], delta["alive"][lo:hi],
+            )
+
+    # ------------------------------------------------------------------
+    # Columnar on-disk format
+    # ------------------------------------------------------------------
+    def save(self, directory: str):
+        """Write a compacted index as ``.npy`` columns plus ``manifest.json`` (written last)."""
+        if not self.is_compact():
+            raise ValueError("Only a compacted BM25 index can be saved")
+        tf = self._segments[0][1] if self._segments else sparse.csr_matrix((len(self.vocab), 0), dtype=np.int32)
+        # Equal index dtypes let scipy wrap the mapped arrays without copying them
+        index_dtype = np.int64 if tf.nnz >= np.iinfo(np.int32).max else np.int32
+
+        columns = {
+            "tf_indptr": tf.indptr.astype(index_dtype),
+            "tf_indices": tf.indices.astype(index_dtype),
+            "tf_data": tf.data.astype(np.int32),
+            "df": self.df,
+            "doc_len": self.doc_len,
+            # Tokens never contain whitespace, so the vocabulary is newline separated
+            "vocab": np.frombuffer("\n".join(self.vocab).encode("utf-8"), dtype=np.uint8),
+        }
+        columns["ids_blob"], columns["ids_offsets"] = _encode_column(self.ids, str)
+        columns["docs_blob"], columns["docs_offsets"] = _encode_column(self.docs, lambda d: d or "")
+        columns["metas_blob"], columns["metas_offsets"] = _encode_column(
+            self.metas, lambda m: json.dumps(m, ensure_ascii=False)
+        )
+
+        os.makedirs(directory, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "base_id": self.base_id,
+            "fingerprint": self.fingerprint,
+            "id_hash": f"{self._id_hash_sum:016x}",
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "n_docs": len(self.ids),
+            "n_terms": len(self.vocab),
+            "nnz": int(tf.nnz),
+        }
+        with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str) -> "SparseBM25":
+        """Open an index written by ``save``; large columns stay memory-mapped."""
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 format version {manifest.get('format_version')}")
+
+        def column(name: str, mode: str = "r") -> np.ndarray:
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+
+        index = cls([], k1=manifest["k1"], b=manifest["b"], epsilon=manifest["epsilon"])
+        vocab_text = bytes(column("vocab")).decode("utf-8")
+        index.vocab = {term: i for i, term in enumerate(vocab_text.split("\n"))} if vocab_text else {}
+        n_docs = manifest["n_docs"]
+        if len(index.vocab) != manifest["n_terms"]:
+            raise ValueError("BM25 vocabulary does not match its manifest")
+
+        tf = sparse.csr_matrix(
+            (column("tf_data"), column("tf_indices"), column("tf_indptr")),
+            shape=(len(index.vocab), n_docs),
+            copy=False,
+        )
+        index._segments = [(0, tf)]
+        index.ids = _BlobColumn(column("ids_blob"), column("ids_offsets"))
+        index.docs = _BlobColumn(column("docs_blob"), column("docs_offsets"))
+        index.metas = _BlobColumn(column("metas_blob"), column("metas_offsets"), decode=json.loads)
+        # Copy-on-write: pages stay shared until this process updates a frequency
+        index.df = column("df", mode="c")
+        index.doc_len = column("doc_len")
+        index.alive = np.ones(n_docs, dtype=bool)
+        index._id_to_slot = None
+
+        index.corpus_size = n_docs
+        index.total_len = float(index.doc_len.sum())
+        index._id_hash_sum = int(manifest["id_hash"], 16)
+        index.base_id = manifest["base_id"]
+        index.base_slots = n_docs
+        index.base_vocab = len(index.vocab)
+        index._touch()
+        return index
@@ -0,0 +1,175 @@
+"""
+Token-budgeted context packing for the RAG prompt.
+
+The retrieved chunks used to be joined as they came back. Sub-chunks of a long
+article overlap by 30 words and each repeats the "سياق التشريع" prefix, so the
+prompt carried the same text several times and had no size limit. The packer:
+
+  1. drops chunks whose word shingles are mostly contained in a kept chunk
+  2. merges chunks that are adjacent in the same file (consecutive
+     ``chunk_index``) into one block, removing the repeated prefix and overlap
+  3. adds blocks in fused-score order while they fit in the token budget
+
+Tokens are counted with the local encoder's tokenizer, which is close enough
+to the LLM's count to size the prompt. The packer loads its own instance of
+it (``from_encoder``). A shared fast tokenizer would be called with different
+truncation settings while the encoder uses it, and the Rust backend then
+fails with "Already borrowed".
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Sequence
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_OVERLAP_THRESHOLD = float(os.getenv("RAG_CONTEXT_OVERLAP_THRESHOLD", "0.8"))
+
+_CONTEXT_PREFIX = re.compile(r'^سياق التشريع: .*? \| ')
+_SHINGLE_SIZE = 3
+# Longest word overlap looked for when joining adjacent sub-chunks
+_MAX_JOIN_OVERLAP = 60
+
+
+def format_block(filename: str, text: str) -> str:
+    return f"--- نص قانوني من تشريع: {filename} ---\n{text}"
+
+
+def _shingles(text: str) -> set:
+    words = text.split()
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def _join_adjacent(first: str, second: str) -> str:
+    """Append ``second`` to ``first`` without repeating its prefix or the shared overlap.
+
+    Both texts keep their own line breaks (article headers, numbered clauses).
+    """
+    prefix = _CONTEXT_PREFIX.match(second)
+    if prefix and first.startswith(prefix.group(0)):
+        second = second[prefix.end():]
+    first = first.rstrip()
+    a = first.split()
+    b = list(re.finditer(r'\S+', second))
+    for size in range(min(len(a), len(b), _MAX_JOIN_OVERLAP), 0, -1):
+        if a[-size:] == [m.group(0) for m in b[:size]]:
+            # Continue right after the shared words, with second's own separator
+            return first + second[b[size - 1].end():].rstrip()
+    return first + "\n" + second.strip() if b else first
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        tokenizer,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        overlap_threshold: float = CONTEXT_OVERLAP_THRESHOLD,
+    ):
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.overlap_threshold = overlap_threshold
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    @classmethod
+    def from_encoder(cls, encoder, **kwargs) -> "ContextPacker":
+        """Packer with its own copy of ``encoder``'s tokenizer."""
+        from transformers import AutoTokenizer
+
+        return cls(AutoTokenizer.from_pretrained(encoder.tokenizer.name_or_path), **kwargs)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def pack(self, documents: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """Pack one query's fused chunks (best first) into a prompt context.
+
+        Returns the context text, the packed block texts and their sources,
+        and the token counts before and after packing.
+        """
+        metadatas = [meta or {} for meta in metadatas]
+        tokens_in = sum(
+            self.count_tokens(format_block(meta.get("filename", "Unknown"), doc))
+            for doc, meta in zip(documents, metadatas)
+        )
+
+        # 1. Near-duplicates: keep the better ranked of two overlapping chunks
+        kept: List[int] = []
+        kept_shingles: List[set] = []
+        for i, doc in enumerate(documents):
+            shingles = _shingles(_CONTEXT_PREFIX.sub("", doc, count=1))
+            if any(
+                len(shingles & other) / max(min(len(shingles), len(other)), 1) > self.overlap_threshold
+                for other in kept_shingles
+            ):
+                continue
+            kept.append(i)
+            kept_shingles.append(shingles)
+
+        # 2. Merge runs of consecutive chunk_index from the same file; a run
+        #    takes the rank of its best member
+        by_position = {
+            (metadatas[i].get("filename"), metadatas[i].get("chunk_index")): i
+            for i in kept if metadatas[i].get("chunk_index") is not None
+        }
+        blocks = []
+        merged = set()
+        for i in kept:
+            if i in merged:
+                continue
+            filename, index = metadatas[i].get("filename"), metadatas[i].get("chunk_index")
+            run = [i]
+            if index is not None:
+                while (filename, index - 1) in by_position and by_position[(filename, index - 1)] not in merged:
+                    index -= 1
+                    run.insert(0, by_position[(filename, index)])
+                index = metadatas[i].get("chunk_index")
+                while (filename, index + 1) in by_position and by_position[(filename, index + 1)] not in merged:
+                    index += 1
+                    run.append(by_position[(filename, index)])
+            merged.update(run)
+            text = documents[run[0]]
+            for j in run[1:]:
+                text = _join_adjacent(text, documents[j])
+            blocks.append((filename or "Unknown", text))
+
+        # 3. Fill the budget in rank order, skipping blocks that no longer fit
+        #    (the best block is always kept, even when it alone is over budget)
+        packed, sources = [], []
+        tokens_out = 0
+        for filename, text in blocks:
+            block = format_block(filename, text)
+            # +1 for the blank line between blocks
+            cost = self.count_tokens(block) + 1
+            if tokens_out + cost > self.token_budget and packed:
+                continue
+            packed.append(block)
+            if filename not in sources:
+                sources.append(filename)
+            tokens_out += cost
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+        return {
+            "context": "\n\n".join(packed),
+            "blocks": packed,
+            "sources": sources,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+        }
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "token_budget": self.token_budget,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "tokens_saved_ratio": 1 - self.tokens_out / self.tokens_in if self.tokens_in else 0.0,
+            }
@@ -1,7 +1,14 @@
 import os
-from typing import List, Dict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Dict, Iterator, Optional, Sequence, Tuple
 from docx import Document
 
+
+def _load_file_worker(directory_path: str, filename: str) -> Tuple[str, Optional[Dict[str, str]]]:
+    # Module level so it can be pickled into the worker processes
+    return filename, DocumentLoader(directory_path).load_file(filename)
+
+
 class DocumentLoader:
     def __init__(self, directory_path: str):
         self.directory_path = directory_path
@@ -11,20 +18,58 @@ class DocumentLoader:
         return self.load_all_files()
 
     def load_all_files(self) -> List[Dict[str, str]]:
-        documents = []
+        return [doc for _, doc in self.iter_files() if doc is not None]
+
+    def iter_files(
+        self,
+        filenames: Optional[Sequence[str]] = None,
+        workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+    ) -> Iterator[Tuple[str, Optional[Dict[str, str]]]]:
+        """Parse files in a process pool, yielding ``(filename, doc)`` as each one finishes.
+
+        At most ``max_in_flight`` files are queued or parsed at a time, so
+        memory stays bounded however large the directory is. ``doc`` is None
+        for an empty .txt file.
+        """
+        filenames = list(self.list_files() if filenames is None else filenames)
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(filenames) < 2:
+            for filename in filenames:
+                yield filename, self.load_file(filename)
+            return
+
+        max_in_flight = max_in_flight or workers * 2
+        remaining = iter(filenames)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            for filename in remaining:
+                in_flight.add(pool.submit(_load_file_worker, self.directory_path, filename))
+                if len(in_flight) >= max_in_flight:
+                    break
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    next_file = next(remaining, None)
+                    if next_file is not None:
+                        in_flight.add(pool.submit(_load_file_worker, self.directory_path, next_file))
+
+    def list_files(self) -> List[str]:
+        """Names of the supported files in the directory."""
         if not os.path.exists(self.directory_path):
-            return documents
-            
-        for filename in os.listdir(self.directory_path):
-            file_path = os.path.join(self.directory_path, filename)
-            if filename.endswith(".docx"):
-                text = self._extract_docx_text(file_path)
-                documents.append({"filename": filename, "content": text})
-            elif filename.endswith(".txt"):
-                text = self._extract_txt_text(file_path)
-                if text.strip():
-                    documents.append({"filename": filename, "content": text})
-        return documents
+            return []
+        return [f for f in os.listdir(self.directory_path) if f.endswith((".docx", ".txt"))]
+
+    def load_file(self, filename: str) -> Optional[Dict[str, str]]:
+        """Parse one file; None for an empty .txt file."""
+        file_path = os.path.join(self.directory_path, filename)
+        if filename.endswith(".docx"):
+            return {"filename": filename, "content": self._extract_docx_text(file_path)}
+        text = self._extract_txt_text(file_path)
+        if text.strip():
+            return {"filename": filename, "content": text}
+        return None
 
     def _extract_docx_text(self, file_path: str) -> str:
         doc = Document(file_path)
@@ -0,0 +1,128 @@
+"""
+Query embedding cache.
+
+Encoding a query with bge-m3 on CPU is the most expensive step of retrieval
+and users repeat the same legal questions a lot. Embeddings are cached per
+normalised query in a bounded in-process LRU with a TTL. An optional SQLite
+file acts as a second tier that every worker process on the host can share.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+_DIACRITICS = re.compile(r'[\u064B-\u065F\u0670\u0640]')  # tashkeel + tatweel
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """Fold differences that do not change the meaning of a question."""
+    query = _DIACRITICS.sub('', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+class QueryEmbeddingCache:
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600.0,
+        disk_path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+    ):
+        # Embeddings from different models must never be mixed
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_puts = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " namespace TEXT, query TEXT, created REAL, vector BLOB,"
+                " PRIMARY KEY (namespace, query))"
+            )
+            self._db.commit()
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[query]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, vector FROM query_embeddings WHERE namespace = ? AND query = ?",
+                    (self.namespace, query),
+                ).fetchone()
+                if row is not None and now - row[0] <= self.ttl_seconds:
+                    vector = np.frombuffer(row[1], dtype=np.float32)
+                    self._remember(query, row[0], vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vector: np.ndarray):
+        vector = np.asarray(vector, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._remember(query, now, vector)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                    (self.namespace, query, now, vector.tobytes()),
+                )
+                self._disk_puts += 1
+                if self._disk_puts % 256 == 0:
+                    self._prune_disk(now)
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[QUERY CACHE] Disk tier write failed: {e}")
+
+    def _remember(self, query: str, created: float, vector: np.ndarray):
+        self._entries[query] = (created, vector)
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _prune_disk(self, now: float):
+        self._db.execute("DELETE FROM query_embeddings WHERE created < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE rowid NOT IN "
+            "(SELECT rowid FROM query_embeddings ORDER BY created DESC LIMIT ?)",
+            (self.max_disk_entries,),
+        )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,190 @@
+"""
+Embedding backends for the RAG pipeline.
+
+Both backends expose ``encode(texts, batch_size) -> np.ndarray`` and return
+L2-normalised float32 vectors of the same model, so they are interchangeable
+inside ``VectorStoreManager``:
+
+  - ``torch``: SentenceTransformer in full precision (default)
+  - ``onnx``:  ONNX Runtime with a dynamically int8-quantized export of the
+               model, built once by ``scripts/export_onnx_encoder.py``
+
+The backend is selected with ``RAG_ENCODER_BACKEND``.
+
+Both backends also expose their ``tokenizer`` and ``embed_features``, which
+``encode_bucketed`` uses to run ingestion as a pipeline: one batched
+tokenisation call, then length-sorted batches sized to a token budget.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+ENCODER_BACKEND = os.getenv("RAG_ENCODER_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR", "./models/bge-m3-onnx-int8")
+ONNX_INT8_FILENAME = "model_int8.onnx"
+
+# Ingestion batching: padded tokens per forward pass, and padding threads
+INGEST_MAX_BATCH_TOKENS = int(os.getenv("RAG_INGEST_MAX_BATCH_TOKENS", "16384"))
+INGEST_MAX_BATCH_SIZE = int(os.getenv("RAG_INGEST_MAX_BATCH_SIZE", "128"))
+INGEST_PAD_WORKERS = int(os.getenv("RAG_INGEST_PAD_WORKERS", "2"))
+
+
+class SentenceTransformerEncoder:
+    def __init__(self, model_name: str, max_seq_length: int = 512):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.model.max_seq_length = max_seq_length
+        self.max_seq_length = max_seq_length
+        self.tokenizer = self.model.tokenizer
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+        )
+
+    def embed_features(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Embed an already tokenized, padded batch."""
+        import torch
+
+        with torch.no_grad():
+            batch = {k: torch.from_numpy(v).to(self.model.device) for k, v in features.items()}
+            embeddings = self.model(batch)["sentence_embedding"]
+            embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+        return embeddings.cpu().numpy()
+
+
+class OnnxEncoder:
+    """bge-m3 dense embeddings (CLS pooling + L2 norm) from an int8 ONNX export."""
+
+    def __init__(self, model_dir: str, max_seq_length: int = 512, intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, ONNX_INT8_FILENAME)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found. Run: python scripts/export_onnx_encoder.py --output {model_dir}"
+            )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.max_seq_length = max_seq_length
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        # Longest first, like SentenceTransformer, so each batch pads to similar lengths
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        embeddings = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            features = self.tokenizer(
+                [texts[i] for i in batch_idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            cls = self.embed_features(features)
+            if embeddings.shape[1] == 0:
+                embeddings = np.empty((len(texts), cls.shape[1]), dtype=np.float32)
+            embeddings[batch_idx] = cls
+        return embeddings
+
+    def embed_features(self, features: Dict[str, np.ndarray]) -> np.ndarray:
+        """Embed an already tokenized, padded batch."""
+        feeds = {k: v.astype(np.int64) for k, v in features.items() if k in self._input_names}
+        cls = self.session.run(None, feeds)[0][:, 0]
+        return cls / np.linalg.norm(cls, axis=1, keepdims=True)
+
+
+def _pad(sequences: List[List[int]], pad_id: int) -> Dict[str, np.ndarray]:
+    width = max(len(seq) for seq in sequences)
+    input_ids = np.full((len(sequences), width), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(sequences), width), dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        input_ids[row, :len(seq)] = seq
+        attention_mask[row, :len(seq)] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+def encode_bucketed(
+    encoder,
+    texts: Sequence[str],
+    max_batch_tokens: int = INGEST_MAX_BATCH_TOKENS,
+    max_batch_size: int = INGEST_MAX_BATCH_SIZE,
+    workers: int = INGEST_PAD_WORKERS,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Embed ``texts`` for ingestion, yielding ``(indices, embeddings)`` per batch.
+
+    Texts are tokenised once, in a single call on this thread: the Rust fast
+    tokenizer already encodes a batch in parallel, and one instance must not
+    be called from several threads at once ("Already borrowed"). They are
+    then sorted by token length and cut into batches of at most
+    ``max_batch_tokens`` padded tokens, so short articles travel in large
+    batches and long ones in small ones. Padding for the next batches runs in
+    a thread pool while the model embeds the current one.
+    """
+    if not texts:
+        return
+    tokenizer = encoder.tokenizer
+    pad_id = tokenizer.pad_token_id or 0
+    # Same preprocessing as SentenceTransformer.tokenize
+    texts = [str(t).strip() for t in texts]
+
+    input_ids = tokenizer(texts, truncation=True, max_length=encoder.max_seq_length)["input_ids"]
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        order = sorted(range(len(texts)), key=lambda i: -len(input_ids[i]))
+        batches = []
+        pos = 0
+        while pos < len(order):
+            padded_len = max(len(input_ids[order[pos]]), 1)
+            size = max(1, min(max_batch_size, max_batch_tokens // padded_len))
+            batches.append(order[pos:pos + size])
+            pos += size
+
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(_pad, [input_ids[i] for i in batch], pad_id)))
+            if len(pending) > max(workers, 1):
+                done, features = pending.popleft()
+                yield np.asarray(done), encoder.embed_features(features.result())
+        while pending:
+            done, features = pending.popleft()
+            yield np.asarray(done), encoder.embed_features(features.result())
+
+
+def export_onnx_int8(model_name: str, output_dir: str):
+    """Export ``model_name`` to ONNX and write a dynamically int8-quantized copy."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+    model.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    quantize_dynamic(
+        os.path.join(output_dir, "model.onnx"),
+        os.path.join(output_dir, ONNX_INT8_FILENAME),
+        weight_type=QuantType.QInt8,
+        # The fp32 bge-m3 graph is over protobuf's 2 GB limit
+        use_external_data_format=True,
+    )
+
+
+def load_encoder(model_name: str, backend: str = ENCODER_BACKEND, max_seq_length: int = 512):
+    if backend == "torch":
+        return SentenceTransformerEncoder(model_name, max_seq_length=max_seq_length)
+    if backend == "onnx":
+        return OnnxEncoder(ONNX_MODEL_DIR, max_seq_length=max_seq_length)
+    raise ValueError(f"Unknown RAG_ENCODER_BACKEND '{backend}' (expected 'torch' or 'onnx')")
@@ -0,0 +1,93 @@
+"""
+Optional cross-encoder reranking stage.
+
+RRF only looks at ranks, so the fused top 10 often contains chunks that share
+words with the question without answering it. When ``RAG_RERANKER_MODEL`` is
+set (for example ``cross-encoder/mmarco-mMiniLMv2-L12-H384-v1``), the top
+``RAG_RERANK_CANDIDATES`` fused chunks are re-scored by a cross-encoder in one
+batched pass and only the best ``RAG_RERANK_TOP_N`` are sent to the LLM.
+
+Scores are cached per (normalised query, chunk id). Chunk ids are derived from
+the chunk text, so an edited article gets a new id and never reuses a stale
+score.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.rag.embedding_cache import normalize_query
+
+RERANKER_MODEL = os.getenv("RAG_RERANKER_MODEL", "")
+RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "20"))
+RERANK_TOP_N = int(os.getenv("RAG_RERANK_TOP_N", "5"))
+RERANK_CACHE_SIZE = int(os.getenv("RAG_RERANK_CACHE_SIZE", "50000"))
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str, max_length: int = 512, cache_size: int = RERANK_CACHE_SIZE):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        self.cache_size = cache_size
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def score_batch(self, queries: Sequence[str], candidates: Sequence[Sequence[Tuple[str, str]]]) -> List[List[float]]:
+        """Scores of each query's ``(chunk_id, text)`` candidates.
+
+        Cache misses of all queries go through the model in a single batch.
+        """
+        keys = [[(normalize_query(q), chunk_id) for chunk_id, _ in cands] for q, cands in zip(queries, candidates)]
+        scores: List[List[Optional[float]]] = []
+        missing: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        with self._lock:
+            for q, cands, q_keys in zip(queries, candidates, keys):
+                row = []
+                for (chunk_id, text), key in zip(cands, q_keys):
+                    score = self._scores.get(key)
+                    if score is None:
+                        self.misses += 1
+                        missing[key] = (q, text)
+                    else:
+                        self.hits += 1
+                        self._scores.move_to_end(key)
+                    row.append(score)
+                scores.append(row)
+
+        if missing:
+            predicted = self.model.predict(list(missing.values()), convert_to_numpy=True)
+            fresh = dict(zip(missing, (float(s) for s in predicted)))
+            with self._lock:
+                for key, score in fresh.items():
+                    self._scores[key] = score
+                    self._scores.move_to_end(key)
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+            scores = [
+                [fresh[key] if score is None else score for score, key in zip(row, q_keys)]
+                for row, q_keys in zip(scores, keys)
+            ]
+        return scores
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._scores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def load_reranker(model_name: str = RERANKER_MODEL) -> Optional[CrossEncoderReranker]:
+    """The configured reranker, or None when reranking is disabled."""
+    if not model_name:
+        return None
+    return CrossEncoderReranker(model_name)
@@ -1,5 +1,7 @@
 import re
-from typing import List
+from typing import List, Optional, Tuple
+
+from app.rag.article_index import parse_article_number
 
 class ArabicTextProcessor:
     def __init__(self, max_chunk_words: int = 200, overlap_words: int = 30):
@@ -16,19 +18,24 @@ class ArabicTextProcessor:
         return text.strip()
 
     def split_into_articles(self, text: str, doc_context: str = "") -> List[str]:
+        return [chunk for chunk, _ in self.split_into_numbered_articles(text, doc_context)]
+
+    def split_into_numbered_articles(self, text: str, doc_context: str = "") -> List[Tuple[str, Optional[int]]]:
+        """Like ``split_into_articles``, paired with each chunk's article number (None for the preamble)."""
         # Match both forms of مادة with Arabic/Western numerals
         pattern = r"((?:المادة|مادة|الماده|ماده)\s*\(?\s*[\d٠-٩]+\s*\)?)"
         parts = re.split(pattern, text)
 
         chunks = []
         if parts and parts[0].strip():
-            chunks.extend(self._split_large_text(parts[0].strip(), doc_context))
+            chunks.extend((c, None) for c in self._split_large_text(parts[0].strip(), doc_context))
 
         for i in range(1, len(parts), 2):
             header = parts[i].strip()
             content = parts[i + 1].strip() if i + 1 < len(parts) else ""
             combined = f"{header}\n{content}"
-            chunks.extend(self._split_large_text(combined, doc_context))
+            number = parse_article_number(header)
+            chunks.extend((c, number) for c in self._split_large_text(combined, doc_context))
 
         return chunks
 
@@ -3,11 +3,35 @@ import numpy as np
 import pickle
 import os
 import re
-from sentence_transformers import SentenceTransformer
-from rank_bm25 import BM25Okapi
+import shutil
+import threading
+import time
+from app.rag.answer_cache import content_hash
+from app.rag.article_index import ArticleIndex
+from app.rag.bm25 import SparseBM25, corpus_fingerprint
+from app.rag.embedding_cache import QueryEmbeddingCache, normalize_query
+from app.rag.encoders import ENCODER_BACKEND, encode_bucketed, load_encoder
+from app.rag.reranker import RERANK_CANDIDATES, RERANKER_MODEL, load_reranker
 from typing import List, Dict, Any, Optional
 
-BM25_CACHE_PATH = "./chroma_db/bm25_cache.pkl"
+# Columnar BM25 index: CURRENT names the active base-<id>/ directory
+BM25_DIR = "./chroma_db/bm25"
+BM25_DELTA_PATH = os.path.join(BM25_DIR, "delta.pkl")
+# Pickled cache written by earlier versions; replaced on first load
+LEGACY_BM25_CACHE_PATH = "./chroma_db/bm25_cache.pkl"
+# (filename, article number) -> chunk ids, saved together with each BM25 base
+ARTICLE_INDEX_PATH = "./chroma_db/article_index.json"
+
+# Query embedding cache; set RAG_QUERY_CACHE_PATH to share it across workers
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+QUERY_CACHE_PATH = os.getenv("RAG_QUERY_CACHE_PATH")
+
+# Chunks per Chroma write while ingesting (Chroma rejects very large batches)
+INGEST_UPSERT_BATCH = int(os.getenv("RAG_INGEST_UPSERT_BATCH", "256"))
+
+# Seconds between checks for a BM25 base/delta written by another process
+BM25_RELOAD_CHECK_SECONDS = float(os.getenv("RAG_BM25_RELOAD_CHECK_SECONDS", "5"))
 
 # Arabic diacritics pattern
 _DIACRITICS = re.compile(r'[\u064B-\u065F\u0670]')
@@ -34,137 +58,570 @@ def _arabic_tokenize(text: str) -> List[str]:
     return result
 
 class VectorStoreManager:
-    def __init__(self, db_path: str = "./chroma_db", model_name: str = "BAAI/bge-m3"):
+    """Hybrid (vector + BM25) retrieval over the legislation collection.
+
+    Loading the encoder and the BM25 cache is expensive, so the API keeps a
+    single instance per process (see ``lifespan`` in ``app.main``). The BM25
+    index is mutated and scored under ``_lock``; compaction builds and writes
+    its result from a snapshot and only takes the lock to swap it in.
+
+    ``scripts/ingest_docx.py`` runs in its own process and writes new BM25
+    files while the API is up. Searches stat CURRENT and the delta (at most
+    every ``RAG_BM25_RELOAD_CHECK_SECONDS``) and reload the index and the
+    article index when another process changed them.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "./chroma_db",
+        model_name: str = "BAAI/bge-m3",
+        encoder_backend: str = ENCODER_BACKEND,
+        reranker_model: str = RERANKER_MODEL,
+        rerank_candidates: int = RERANK_CANDIDATES,
+    ):
+        self._lock = threading.RLock()
+        self._compacting = False
         self.client = chromadb.PersistentClient(path=db_path)
         self.collection = self.client.get_or_create_collection(
             name="legal_documents",
             metadata={"hnsw:space": "cosine"}
         )
-        self.encoder = SentenceTransformer(model_name)
-        self.encoder.max_seq_length = 512
-        self._bm25: Optional[BM25Okapi] = None
-        self._bm25_docs: List[str] = []
-        self._bm25_ids: List[str] = []
+        self.encoder = load_encoder(model_name, backend=encoder_backend, max_seq_length=512)
+        if QUERY_CACHE_PATH:
+            os.makedirs(os.path.dirname(os.path.abspath(QUERY_CACHE_PATH)), exist_ok=True)
+        self.query_cache = QueryEmbeddingCache(
+            namespace=f"{model_name}:{encoder_backend}",
+            max_entries=QUERY_CACHE_SIZE,
+            ttl_seconds=QUERY_CACHE_TTL,
+            disk_path=QUERY_CACHE_PATH,
+        )
+        # Optional cross-encoder stage after RRF (None unless RAG_RERANKER_MODEL is set)
+        self.reranker = load_reranker(reranker_model)
+        self.rerank_candidates = rerank_candidates
+        self._bm25: Optional[SparseBM25] = None
+        self.article_index = ArticleIndex()
+        # (CURRENT, delta) file state as of our last load or write
+        self._disk_state: Optional[tuple] = None
+        self._next_reload_check = 0.0
         self._load_bm25_cache()
 
+    def warmup(self):
+        """Run a dummy encode so the first real request does not pay for lazy init."""
+        self.encoder.encode(["تهيئة"])
+        if self.reranker is not None:
+            self.reranker.model.predict([("تهيئة", "تهيئة")])
+
     # ------------------------------------------------------------------
     # BM25 cache helpers
     # ------------------------------------------------------------------
     def _load_bm25_cache(self):
-        if os.path.exists(BM25_CACHE_PATH):
+        current_path = os.path.join(BM25_DIR, "CURRENT")
+        if not os.path.exists(current_path):
+            if self.collection.count():
+                print("[BM25] No columnar cache found, building it from ChromaDB...")
+                self._rebuild_bm25()
+            return
+        try:
+            state = self._bm25_disk_state()
+            bm25 = self._read_bm25_files()
+            # Never serve an index built from a different set of chunks than Chroma holds
+            expected = corpus_fingerprint(self.collection.get(include=[])["ids"])
+            if bm25.fingerprint != expected:
+                raise ValueError(f"fingerprint {bm25.fingerprint} != collection {expected}")
+            index = self._load_article_index(bm25, expected)
+            with self._lock:
+                self._bm25 = bm25
+                self.article_index = index
+                self._disk_state = state
+        except Exception as e:
+            print(f"[BM25] Cache unusable ({e}), rebuilding from ChromaDB...")
+            self._bm25 = None
+            self._rebuild_bm25()
+
+    @staticmethod
+    def _read_bm25_files() -> SparseBM25:
+        """The base named by CURRENT with the delta applied."""
+        with open(os.path.join(BM25_DIR, "CURRENT"), encoding="utf-8") as f:
+            base_dir = os.path.join(BM25_DIR, f.read().strip())
+        bm25 = SparseBM25.load(base_dir)
+        if os.path.exists(BM25_DELTA_PATH):
+            with open(BM25_DELTA_PATH, "rb") as f:
+                bm25.apply_delta(pickle.load(f))
+        return bm25
+
+    @staticmethod
+    def _bm25_disk_state() -> tuple:
+        """Cheap signature of CURRENT and the delta; changes whenever either is rewritten."""
+        state = []
+        for path in (os.path.join(BM25_DIR, "CURRENT"), BM25_DELTA_PATH):
             try:
-                with open(BM25_CACHE_PATH, "rb") as f:
-                    cache = pickle.load(f)
-                self._bm25 = cache["bm25"]
-                self._bm25_docs = cache["docs"]
-                self._bm25_ids = cache["ids"]
-            except Exception:
-                self._bm25 = None
+                st = os.stat(path)
+                state.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    @staticmethod
+    def _load_article_index(bm25: SparseBM25, fingerprint: str, save: bool = True) -> ArticleIndex:
+        index = ArticleIndex.load(ARTICLE_INDEX_PATH)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+        # Rebuilt from the metadata already held by the BM25 index, no Chroma read
+        print("[ARTICLES] Index missing or stale, rebuilding it...")
+        index = ArticleIndex()
+        live = np.flatnonzero(bm25.alive)
+        index.rebuild([bm25.ids[s] for s in live], [bm25.metas[s] for s in live])
+        if save:
+            index.save(ARTICLE_INDEX_PATH, fingerprint)
+        return index
+
+    def _reload_if_stale(self):
+        """Swap in BM25 files written by another process (e.g. ``ingest_docx.py``)."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_reload_check or self._compacting:
+                return
+            self._next_reload_check = now + BM25_RELOAD_CHECK_SECONDS
+            previous = self._disk_state
+        state = self._bm25_disk_state()
+        if state == previous or state[0] is None:
+            return
+        try:
+            bm25 = self._read_bm25_files()
+            expected = corpus_fingerprint(self.collection.get(include=[])["ids"])
+            if bm25.fingerprint != expected:
+                # The writer has updated Chroma but not BM25 yet: retry on a later check
+                return
+            # The writer saves the article index with each base, not with each delta
+            index = self._load_article_index(bm25, expected, save=False)
+        except Exception as e:
+            print(f"[BM25] Reload skipped ({e})")
+            return
+        with self._lock:
+            # This process wrote the files itself in the meantime
+            if self._disk_state != previous:
+                return
+            self._bm25 = bm25
+            self.article_index = index
+            self._disk_state = state
+        print(f"[BM25] Reloaded index changed by another process ({len(bm25)} chunks)")
 
     def _save_bm25_cache(self):
+        """Write the full index as a new columnar base and drop the now-empty delta."""
         try:
-            os.makedirs(os.path.dirname(BM25_CACHE_PATH), exist_ok=True)
-            with open(BM25_CACHE_PATH, "wb") as f:
-                pickle.dump({
-                    "bm25": self._bm25,
-                    "docs": self._bm25_docs,
-                    "ids": self._bm25_ids
-                }, f)
+            base = self._write_bm25_base(self._bm25)
+            with self._lock:
+                self._publish_bm25_base(base)
+            self._finish_bm25_base()
         except Exception as e:
             print(f"[BM25] Could not save cache: {e}")
 
+    @staticmethod
+    def _write_bm25_base(bm25: SparseBM25) -> SparseBM25:
+        """Write ``bm25`` as a new base directory and return its memory-mapped copy.
+
+        The directory is not named by CURRENT yet, so no lock is needed.
+        """
+        bm25 = bm25 if bm25.is_compact() else bm25.compacted()
+        bm25.rebase()
+        base_dir = os.path.join(BM25_DIR, f"base-{bm25.base_id}")
+        bm25.save(base_dir)
+        # Serve from the mapped files rather than the heap copy just written
+        return SparseBM25.load(base_dir)
+
+    def _publish_bm25_base(self, base: SparseBM25):
+        """Point CURRENT at ``base`` and serve it; the caller holds ``_lock``."""
+        current_path = os.path.join(BM25_DIR, "CURRENT")
+        with open(f"{current_path}.tmp", "w", encoding="utf-8") as f:
+            f.write(f"base-{base.base_id}")
+        os.replace(f"{current_path}.tmp", current_path)
+        if os.path.exists(BM25_DELTA_PATH):
+            os.remove(BM25_DELTA_PATH)
+        self._bm25 = base
+        self._disk_state = self._bm25_disk_state()
+
+    def _finish_bm25_base(self):
+        """Save the article index for the published base and delete older bases."""
+        with self._lock:
+            if self._bm25 is None:
+                return
+            base_name = f"base-{self._bm25.base_id}"
+            fingerprint = self._bm25.fingerprint
+        self.article_index.save(ARTICLE_INDEX_PATH, fingerprint)
+        # Old bases may still be mapped by other workers; on POSIX unlinking is safe
+        for name in os.listdir(BM25_DIR):
+            if name.startswith("base-") and name != base_name:
+                shutil.rmtree(os.path.join(BM25_DIR, name), ignore_errors=True)
+        if os.path.exists(LEGACY_BM25_CACHE_PATH):
+            os.remove(LEGACY_BM25_CACHE_PATH)
+
+    def _save_bm25_delta(self):
+        """Persist only what changed since the base was written."""
+        try:
+            os.makedirs(BM25_DIR, exist_ok=True)
+            tmp_path = f"{BM25_DELTA_PATH}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self._bm25.delta_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, BM25_DELTA_PATH)
+            self._disk_state = self._bm25_disk_state()
+        except Exception as e:
+            print(f"[BM25] Could not save delta: {e}")
+
     def _rebuild_bm25(self):
         """Rebuild BM25 index from all documents in ChromaDB."""
         try:
-            all_docs = self.collection.get(include=["documents"])
+            all_docs = self.collection.get(include=["documents", "metadatas"])
             docs = all_docs.get("documents", [])
             ids = all_docs.get("ids", [])
+            metas = all_docs.get("metadatas") or [{} for _ in ids]
             if not docs:
                 return
             # Use Arabic-aware tokenizer for better matching
             tokenized = [_arabic_tokenize(d) for d in docs]
-            self._bm25 = BM25Okapi(tokenized)
-            self._bm25_docs = docs
-            self._bm25_ids = ids
-            self._save_bm25_cache()
+            bm25 = SparseBM25(tokenized, ids=ids, docs=docs, metas=metas)
+            with self._lock:
+                self._bm25 = bm25
+                self.article_index.rebuild(ids, metas)
+                self._save_bm25_cache()
         except Exception as e:
             print(f"[BM25] Could not rebuild index: {e}")
 
+    def _update_bm25(self, chunks: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Index upserted chunks incrementally instead of re-reading the whole corpus."""
+        tokenized = [_arabic_tokenize(c) for c in chunks]
+        with self._lock:
+            if self._bm25 is None:
+                # Nothing cached yet: the collection already holds these chunks
+                self._rebuild_bm25()
+                return
+            self._bm25.add(ids, tokenized, docs=chunks, metas=metadatas)
+            self.article_index.add(ids, metadatas)
+            self._save_bm25_delta()
+            needs_compaction = self._bm25.needs_compaction()
+        if needs_compaction:
+            self._start_compaction()
+
+    def _start_compaction(self):
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact_bm25, name="bm25-compaction", daemon=True).start()
+
+    def _compact_bm25(self, max_attempts: int = 3):
+        """Merge segments and drop tombstones off the request path, then swap."""
+        try:
+            for _ in range(max_attempts):
+                with self._lock:
+                    current = self._bm25
+                    if current is None:
+                        return
+                    generation = current.generation
+                    snapshot = current.snapshot()
+                # Merged and written to disk without the lock; searches keep running
+                base = self._write_bm25_base(snapshot.compacted())
+                with self._lock:
+                    published = self._bm25 is current and current.generation == generation
+                    if published:
+                        self._publish_bm25_base(base)
+                if published:
+                    self._finish_bm25_base()
+                    return
+                # Writes that landed meanwhile are only in ``current``: try again
+                shutil.rmtree(os.path.join(BM25_DIR, f"base-{base.base_id}"), ignore_errors=True)
+        except Exception as e:
+            print(f"[BM25] Compaction failed: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def compact_bm25(self):
+        """Compact synchronously, e.g. at the end of a batch ingestion run."""
+        self._compact_bm25()
+
     # ------------------------------------------------------------------
     # Add documents
     # ------------------------------------------------------------------
     def add_documents(self, chunks: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
-        embeddings = self.encoder.encode(
-            chunks, normalize_embeddings=True, convert_to_numpy=True
-        ).tolist()
-        self.collection.upsert(
-            documents=chunks,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
+        """Embed chunks in length-bucketed batches and stream them into Chroma."""
+        start = time.perf_counter()
+        pending: List[int] = []
+        pending_embeddings: List[List[float]] = []
+
+        def flush():
+            self.collection.upsert(
+                documents=[chunks[i] for i in pending],
+                embeddings=pending_embeddings,
+                metadatas=[metadatas[i] for i in pending],
+                ids=[ids[i] for i in pending]
+            )
+            pending.clear()
+            pending_embeddings.clear()
+
+        for batch_idx, embeddings in encode_bucketed(self.encoder, chunks):
+            pending.extend(batch_idx.tolist())
+            pending_embeddings.extend(embeddings.tolist())
+            if len(pending) >= INGEST_UPSERT_BATCH:
+                flush()
+        if pending:
+            flush()
+
+        elapsed = time.perf_counter() - start
+        if chunks:
+            print(f"[INGEST] Embedded {len(chunks)} chunks in {elapsed:.1f}s "
+                  f"({len(chunks) / max(elapsed, 1e-9):.1f} chunks/s)")
+        self._update_bm25(chunks, metadatas, ids)
+
+    def update_metadatas(self, chunks: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
+        """Replace the metadata of stored chunks whose text did not change (no re-embedding)."""
+        for start in range(0, len(ids), INGEST_UPSERT_BATCH):
+            end = start + INGEST_UPSERT_BATCH
+            self.collection.update(ids=ids[start:end], metadatas=metadatas[start:end])
+        if ids:
+            # Re-adding tombstones the old BM25 slots, like an upsert
+            self._update_bm25(chunks, metadatas, ids)
+
+    def delete_documents(self, ids: List[str]):
+        """Remove chunks from Chroma and from the BM25 index."""
+        if not ids:
+            return
+        for start in range(0, len(ids), INGEST_UPSERT_BATCH):
+            self.collection.delete(ids=ids[start:start + INGEST_UPSERT_BATCH])
+        with self._lock:
+            self.article_index.remove(ids)
+            if self._bm25 is None:
+                return
+            self._bm25.remove(ids)
+            self._save_bm25_delta()
+            needs_compaction = self._bm25.needs_compaction()
+        if needs_compaction:
+            self._start_compaction()
+
+    def clear(self):
+        """Drop the collection and every BM25 file, leaving an empty store."""
+        self.client.delete_collection("legal_documents")
+        self.collection = self.client.get_or_create_collection(
+            name="legal_documents",
+            metadata={"hnsw:space": "cosine"}
         )
-        # Rebuild BM25 after every ingestion
-        self._rebuild_bm25()
+        with self._lock:
+            self._bm25 = None
+            self.article_index = ArticleIndex()
+            shutil.rmtree(BM25_DIR, ignore_errors=True)
+            if os.path.exists(ARTICLE_INDEX_PATH):
+                os.remove(ARTICLE_INDEX_PATH)
+            if os.path.exists(LEGACY_BM25_CACHE_PATH):
+                os.remove(LEGACY_BM25_CACHE_PATH)
+            self._disk_state = self._bm25_disk_state()
+
+    def get_documents(self, ids: List[str]) -> Dict[str, str]:
+        """Current text of the given chunk ids (missing ids are left out)."""
+        with self._lock:
+            bm25 = self._bm25
+            if bm25 is not None:
+                slots = {i: bm25.id_to_slot.get(i) for i in ids}
+                if None not in slots.values():
+                    return {i: bm25.docs[slot] for i, slot in slots.items()}
+        found = self.collection.get(ids=list(ids), include=["documents"])
+        return dict(zip(found["ids"], found["documents"]))
+
+    def chunks_unchanged(self, chunks: Dict[str, str]) -> bool:
+        """True if every ``chunk_id -> content_hash`` still matches the stored text."""
+        current = self.get_documents(list(chunks))
+        return all(i in current and content_hash(current[i]) == h for i, h in chunks.items())
 
     # ------------------------------------------------------------------
     # Hybrid search (BM25 + Vector) with score fusion
     # ------------------------------------------------------------------
-    def search(self, query: str, n_results: int = 7) -> Dict[str, Any]:
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Normalised query embeddings; cache misses are encoded in one batched pass."""
+        keys = [normalize_query(q) for q in queries]
+        cached = [self.query_cache.get(key) for key in keys]
+        missing = sorted({key for key, emb in zip(keys, cached) if emb is None})
+        if missing:
+            encoded = self.encoder.encode(missing)
+            fresh = dict(zip(missing, encoded))
+            for key, embedding in fresh.items():
+                self.query_cache.put(key, embedding)
+            cached = [emb if emb is not None else fresh[key] for key, emb in zip(keys, cached)]
+        return np.vstack(cached)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalised query embedding, served from the query cache when possible."""
+        return self.embed_queries([query])[0]
+
+    def _bm25_search(
+        self, queries: List[str], top_k: int, filenames: Optional[List[str]] = None
+    ) -> List[List[tuple]]:
+        """Top BM25 hits per query as (id, score, text, metadata), best first."""
+        # Use the same Arabic normalization on the queries
+        tokenized = [_arabic_tokenize(q) for q in queries]
+        hits: List[List[tuple]] = [[] for _ in queries]
+        with self._lock:
+            bm25 = self._bm25
+            if bm25 is None or not len(bm25):
+                return hits
+            allowed = bm25.slot_mask("filename", filenames) if filenames else None
+            scores = bm25.get_scores_batch(tokenized, allowed)
+            for qi in range(len(queries)):
+                row = slice(scores.indptr[qi], scores.indptr[qi + 1])
+                slots, values = scores.indices[row], scores.data[row]
+                # Partial selection, no full sort of the corpus
+                for pos in SparseBM25.top_k(values, top_k):
+                    if values[pos] > 0:
+                        slot = slots[pos]
+                        hits[qi].append((bm25.ids[slot], float(values[pos]), bm25.docs[slot], bm25.metas[slot]))
+        return hits
+
+    def search(
+        self, query: str, n_results: int = 7, rerank: bool = True, filenames: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        return self.search_batch([query], n_results=n_results, rerank=rerank, filenames=filenames)
+
+    def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 7,
+        rerank: bool = True,
+        filenames: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Hybrid search for several queries with one encoder pass, one Chroma query
+        and one sparse BM25 product. Results use Chroma's layout: one inner list per
+        query, each identical to what ``search`` returns for that query alone.
+
+        With a reranker configured (and ``rerank`` left on), the top
+        ``RAG_RERANK_CANDIDATES`` fused chunks are re-scored and the best
+        ``n_results`` are returned instead.
+
+        Questions that name one article of an identifiable law ("المادة 152 من
+        قانون ...") are answered from the article index and skip retrieval.
+
+        ``filenames`` restricts every query to chunks of those legislation
+        files, in the Chroma ``where`` clause and in BM25 scoring alike.
+        """
+        results: Dict[str, List] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if not queries:
+            return results
+
+        self._reload_if_stale()
+        direct = [self._article_lookup(q, n_results, filenames) for q in queries]
+        pending = [qi for qi, hit in enumerate(direct) if hit is None]
+        hybrid = (
+            self._hybrid_search([queries[qi] for qi in pending], n_results, rerank, filenames)
+            if pending else None
+        )
+        hybrid_pos = {qi: pos for pos, qi in enumerate(pending)}
+        for qi, hit in enumerate(direct):
+            if hit is None:
+                hit = {key: hybrid[key][hybrid_pos[qi]] for key in results}
+            for key in results:
+                results[key].append(hit[key])
+        return results
+
+    def _article_lookup(
+        self, query: str, n_results: int, filenames: Optional[List[str]] = None
+    ) -> Optional[Dict[str, List]]:
+        """The requested article's chunks in document order, or None to fall back."""
+        ids = self.article_index.resolve(query, _arabic_tokenize, filenames)
+        if not ids:
+            return None
+        ids = ids[:n_results]
+        with self._lock:
+            bm25 = self._bm25
+            slots = [bm25.id_to_slot.get(i) for i in ids] if bm25 is not None else [None]
+            if None not in slots:
+                return {
+                    "ids": ids,
+                    "documents": [bm25.docs[s] for s in slots],
+                    "metadatas": [bm25.metas[s] for s in slots],
+                    "distances": [0.0] * len(ids),
+                }
+        found = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        by_id = {i: (d, m) for i, d, m in zip(found["ids"], found["documents"], found["metadatas"])}
+        ids = [i for i in ids if i in by_id]
+        if not ids:
+            return None
+        return {
+            "ids": ids,
+            "documents": [by_id[i][0] for i in ids],
+            "metadatas": [by_id[i][1] for i in ids],
+            "distances": [0.0] * len(ids),
+        }
+
+    def _hybrid_search(
+        self, queries: List[str], n_results: int, rerank: bool, filenames: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        results: Dict[str, List] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        reranking = rerank and self.reranker is not None
+        n_fused = max(n_results, self.rerank_candidates) if reranking else n_results
+        pool = max(n_results * 5, n_fused)
+
         # --- 1. Vector search ---
-        query_embedding = self.encoder.encode(
-            [query], normalize_embeddings=True, convert_to_numpy=True
-        ).tolist()
+        where = None
+        if filenames:
+            where = {"filename": {"$in": list(filenames)}}
         vector_res = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=min(n_results * 5, self.collection.count())
+            query_embeddings=self.embed_queries(queries).tolist(),
+            n_results=min(pool, self.collection.count()),
+            where=where
         )
 
+        # --- 2. BM25 search (if index available) ---
+        bm25_hits = self._bm25_search(queries, pool, filenames)
+
+        for qi in range(len(queries)):
+            fused = self._fuse(
+                vector_res["ids"][qi] if vector_res["ids"] else [],
+                vector_res["documents"][qi] if vector_res["documents"] else [],
+                vector_res["metadatas"][qi] if vector_res["metadatas"] else [],
+                vector_res["distances"][qi] if vector_res["distances"] else [],
+                bm25_hits[qi],
+                n_fused,
+            )
+            for key in results:
+                results[key].append(fused[key])
+
+        if reranking:
+            self._rerank(queries, results, n_results)
+        return results
+
+    def _rerank(self, queries: List[str], results: Dict[str, List], n_results: int):
+        """Reorder each query's fused candidates by cross-encoder score, in place."""
+        candidates = [list(zip(ids, docs)) for ids, docs in zip(results["ids"], results["documents"])]
+        scores = self.reranker.score_batch(queries, candidates)
+        for qi, query_scores in enumerate(scores):
+            order = sorted(range(len(query_scores)), key=lambda i: query_scores[i], reverse=True)[:n_results]
+            for key in results:
+                results[key][qi] = [results[key][qi][i] for i in order]
+
+    @staticmethod
+    def _fuse(vec_ids, vec_docs, vec_metas, vec_dists, bm25_hits, n_results: int) -> Dict[str, List]:
+        """Reciprocal Rank Fusion of one query's vector and BM25 candidates."""
         # Collect candidates from vector search
         candidate_ids: List[str] = []
         candidate_docs: List[str] = []
         candidate_metas: List[Dict] = []
         vec_scores: Dict[str, float] = {}
 
-        if vector_res["documents"] and vector_res["documents"][0]:
-            for doc, meta, doc_id, dist in zip(
-                vector_res["documents"][0],
-                vector_res["metadatas"][0],
-                vector_res["ids"][0],
-                vector_res["distances"][0]
-            ):
-                # cosine space → distance = 1 - cosine_sim, so similarity = 1 - distance
-                vec_scores[doc_id] = 1.0 - float(dist)
+        for doc, meta, doc_id, dist in zip(vec_docs, vec_metas, vec_ids, vec_dists):
+            # cosine space → distance = 1 - cosine_sim, so similarity = 1 - distance
+            vec_scores[doc_id] = 1.0 - float(dist)
+            candidate_ids.append(doc_id)
+            candidate_docs.append(doc)
+            candidate_metas.append(meta)
+
+        bm25_scores: Dict[str, float] = {}
+        max_score = bm25_hits[0][1] if bm25_hits else 1.0
+        for doc_id, score, doc, meta in bm25_hits:
+            bm25_scores[doc_id] = score / max_score  # normalize to [0,1]
+
+            # Add BM25 candidates not already in vector results, served from
+            # the in-memory corpus instead of one Chroma round trip per id
+            if doc_id not in vec_scores:
                 candidate_ids.append(doc_id)
                 candidate_docs.append(doc)
                 candidate_metas.append(meta)
 
-        # --- 2. BM25 search (if index available) ---
-        bm25_scores: Dict[str, float] = {}
-        if self._bm25 is not None and self._bm25_docs:
-            # Use the same Arabic normalization on the query
-            tokenized_query = _arabic_tokenize(query)
-            raw_scores = self._bm25.get_scores(tokenized_query)
-            # Get top-k BM25 results
-            top_k = min(n_results * 5, len(self._bm25_docs))
-            top_indices = np.argsort(raw_scores)[::-1][:top_k]
-            max_score = raw_scores[top_indices[0]] if top_indices.size > 0 and raw_scores[top_indices[0]] > 0 else 1.0
-            for idx in top_indices:
-                if raw_scores[idx] <= 0:
-                    continue
-                doc_id = self._bm25_ids[idx]
-                bm25_scores[doc_id] = float(raw_scores[idx]) / max_score  # normalize to [0,1]
-
-                # Add BM25 candidates not already in vector results
-                if doc_id not in vec_scores:
-                    try:
-                        fetched = self.collection.get(ids=[doc_id], include=["documents", "metadatas"])
-                        if fetched["documents"]:
-                            candidate_ids.append(doc_id)
-                            candidate_docs.append(fetched["documents"][0])
-                            candidate_metas.append(fetched["metadatas"][0])
-                    except Exception:
-                        pass
-
         # --- 3. Reciprocal Rank Fusion (RRF) ---
         rrf_scores: Dict[str, float] = {}
         k = 60  # RRF constant
@@ -187,14 +644,10 @@ class VectorStoreManager:
         id_to_meta = {doc_id: meta for doc_id, meta in zip(candidate_ids, candidate_metas)}
         id_to_dist = {doc_id: 1.0 - vec_scores.get(doc_id, 0.5) for doc_id in sorted_ids}
 
-        final_docs = [id_to_doc[i] for i in sorted_ids if i in id_to_doc]
-        final_metas = [id_to_meta[i] for i in sorted_ids if i in id_to_meta]
-        final_dists = [id_to_dist[i] for i in sorted_ids if i in id_to_doc]
         final_ids = [i for i in sorted_ids if i in id_to_doc]
-
         return {
-            "ids": [final_ids],
-            "documents": [final_docs],
-            "metadatas": [final_metas],
-            "distances": [final_dists]
+            "ids": final_ids,
+            "documents": [id_to_doc[i] for i in final_ids],
+            "metadatas": [id_to_meta[i] for i in final_ids],
+            "distances": [id_to_dist[i] for i in final_ids],
         }
@@ -0,0 +1,180 @@
+"""
+Normalised-question cache of LLM-generated SQL for /api/db-query.
+
+The same natural-language questions reach ``get_sql_from_llm`` over and
+over, and each one costs a Groq round trip (plus retries and possibly the
+Ollama fallback). Questions are reduced to a template before lookup:
+
+  - diacritics, tatweel, punctuation and whitespace are folded, and so are
+    hamza forms, taa marbuta and alef maqsura (``app/sql_rules.py``)
+  - every number, case number or date becomes a numbered slot
+
+so "من هو المدعي في القضية 563/2021" and "...476/2021" share one entry.
+The SQL is stored with the slot values replaced by markers and is
+re-rendered with the values of the new question. Slot values only contain
+digits and slashes, so rendering cannot inject SQL. Digits inside regex
+quantifiers such as ``~ '^\\d{4}'`` are SQL syntax and are never treated as
+a slot. When the SQL does not contain every slot value exactly once, the
+answer depends on the number in some other way and is not cached.
+
+Only SQL that executed without error is stored. Entries live in an
+in-process LRU and an optional SQLite file shared by every worker. They are
+namespaced by a hash of the system prompt and model, so editing the schema
+prompt invalidates them.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.sql_rules import fold_arabic, normalize_question
+
+TEXT_SQL_CACHE_SIZE = int(os.getenv("TEXT_SQL_CACHE_SIZE", "2048"))
+TEXT_SQL_CACHE_PATH = os.getenv("TEXT_SQL_CACHE_PATH", "")
+
+_NUMBER = re.compile(r'\d+(?:\s*/\s*\d+)*')
+_MARKER = re.compile(r'\{\{slot:(\d+)\}\}')
+_QUANTIFIER = re.compile(r'\{\d*,?\d*\}')
+
+
+def question_template(question: str) -> Tuple[str, List[str]]:
+    """Folded question with numbers replaced by ``<i>``, and the numbers."""
+    slots: List[str] = []
+
+    def slot(match):
+        slots.append(re.sub(r'\s+', '', match.group(0)))
+        return f"<{len(slots) - 1}>"
+
+    return _NUMBER.sub(slot, fold_arabic(normalize_question(question))), slots
+
+
+def sql_template(sql: str, slots: List[str]) -> Optional[str]:
+    """``sql`` with each slot value replaced by its marker, or None if that is ambiguous."""
+    if not slots:
+        return sql
+    if len(set(slots)) != len(slots):
+        return None
+    alternation = "|".join(re.escape(v) for v in sorted(slots, key=len, reverse=True))
+    value = re.compile(r'(?<![\d/])(' + alternation + r')(?![\d/])')
+    quantifiers = [m.span() for m in _QUANTIFIER.finditer(sql)]
+    matches = [
+        m for m in value.finditer(sql)
+        if not any(start <= m.start() < end for start, end in quantifiers)
+    ]
+    found = [m.group(1) for m in matches]
+    if sorted(found) != sorted(slots):
+        return None
+
+    template, pos = [], 0
+    for match in matches:
+        template.append(sql[pos:match.start()])
+        template.append(f"{{{{slot:{slots.index(match.group(1))}}}}}")
+        pos = match.end()
+    template.append(sql[pos:])
+    return "".join(template)
+
+
+def render_sql(template: str, slots: List[str]) -> str:
+    return _MARKER.sub(lambda m: slots[int(m.group(1))], template)
+
+
+class TextToSQLCache:
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = TEXT_SQL_CACHE_SIZE,
+        disk_path: Optional[str] = TEXT_SQL_CACHE_PATH or None,
+    ):
+        # Entries from another schema prompt or model must never be served
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path and max_entries > 0:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS text_sql_cache ("
+                " namespace TEXT, template TEXT, created REAL, sql TEXT,"
+                " PRIMARY KEY (namespace, template))"
+            )
+            self._db.execute("DELETE FROM text_sql_cache WHERE namespace != ?", (namespace,))
+            self._db.commit()
+
+    def get(self, question: str) -> Optional[str]:
+        """SQL for ``question`` rendered from a cached template, or None."""
+        if self.max_entries <= 0:
+            return None
+        key, slots = question_template(question)
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return render_sql(template, slots)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT sql FROM text_sql_cache WHERE namespace = ? AND template = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return render_sql(row[0], slots)
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, sql: str) -> bool:
+        """Cache SQL that executed successfully; False when it cannot be templated."""
+        if self.max_entries <= 0:
+            return False
+        key, slots = question_template(question)
+        template = sql_template(sql, slots)
+        if template is None:
+            return False
+        with self._lock:
+            self._remember(key, template)
+            if self._db is None:
+                return True
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO text_sql_cache VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, time.time(), template),
+                )
+                self._db.execute(
+                    "DELETE FROM text_sql_cache WHERE rowid NOT IN "
+                    "(SELECT rowid FROM text_sql_cache ORDER BY created DESC LIMIT ?)",
+                    (self.max_entries * 10,),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[SQL CACHE] Disk tier write failed: {e}")
+        return True
+
+    def _remember(self, key: str, template: str):
+        self._entries[key] = template
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,160 @@
+"""
+Few-shot text-to-SQL examples and the store that picks them per question.
+
+The system prompt used to carry every hand-written question/SQL pair on
+every call. The pairs now live here, and ``FewShotExampleStore`` returns the
+k most similar to the incoming question by TF-IDF cosine over character
+n-grams of the normalised question. With about twenty short examples this
+costs well under a millisecond and needs no model. The bge-m3 encoder is
+only loaded by the RAG vector store, so using it here would tie text-to-SQL
+to that heavy dependency.
+
+Digits are folded to a single symbol so that case numbers and dates do not
+decide which examples look alike.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.sql_rules import fold_arabic, normalize_question
+
+EXAMPLES_HEADER = """═══════════════════════════════════════════════════
+ أمثلة صحيحة ومُختبَرة على قاعدة البيانات الحقيقية
+═══════════════════════════════════════════════════
+
+"""
+
+SQL_EXAMPLES: List[Tuple[str, str]] = [
+    (
+        "كم عدد القضايا؟",
+        "SELECT COUNT(*) FROM entities;",
+    ),
+    (
+        "من هو محامي المدعى عليه في القضية رقم 588/2021؟",
+        "SELECT defendant_lawyer FROM entities WHERE case_number = '588/2021';",
+    ),
+    (
+        "من هو محامي المدعي في القضية رقم 76/2021؟",
+        "SELECT plaintiff_lawyer FROM entities WHERE case_number = '76/2021';",
+    ),
+    (
+        "ما هو تاريخ الحكم في القضية رقم 563/2021؟",
+        "SELECT judgment_date FROM entities WHERE case_number = '563/2021';",
+    ),
+    (
+        "كم عدد القضاة في القضية رقم 476/2021؟",
+        "SELECT jsonb_array_length(judge::jsonb) FROM entities WHERE case_number = '476/2021';",
+    ),
+    (
+        "كم عدد المدعى عليهم في القضية رقم 552/2021؟",
+        "SELECT jsonb_array_length(defendant::jsonb) FROM entities WHERE case_number = '552/2021';",
+    ),
+    (
+        "كم عدد القضايا بتاريخ 1/9/2021؟",
+        "SELECT COUNT(*) FROM entities WHERE replace(judgment_date, ' ', '') = '1/9/2021';",
+    ),
+    (
+        "ما هي المواد القانونية في القضية رقم 476/2021؟",
+        "SELECT jsonb_array_elements_text(legal_articles::jsonb) FROM entities WHERE case_number = '476/2021';",
+    ),
+    (
+        "كم عدد المواد القانونية في القضية رقم 72/2021؟",
+        "SELECT jsonb_array_length(legal_articles::jsonb) FROM entities WHERE case_number = '72/2021';",
+    ),
+    (
+        "كم عدد المحاكم المختلفة؟",
+        "SELECT COUNT(DISTINCT court_name) FROM entities;",
+    ),
+    (
+        "ما هو رقم القضية الجزائية؟",
+        "SELECT case_number FROM entities WHERE case_type = 'جزائي';",
+    ),
+    (
+        "ما هي القضايا بتاريخ 15/9/2021؟",
+        "SELECT case_number FROM entities WHERE replace(judgment_date, ' ', '') = '15/9/2021';",
+    ),
+    (
+        "من هو المدعي في القضية 563/2021 وكم عدد قضاتها؟",
+        "SELECT plaintiff, jsonb_array_length(judge::jsonb) AS judges_count FROM entities WHERE case_number = '563/2021';",
+    ),
+    (
+        "ما هي القضايا التي استندت للمادة 152؟",
+        "SELECT case_number FROM entities WHERE legal_articles::text LIKE '%152%';",
+    ),
+    (
+        "ما هي القضايا التي محامي المدعى عليه فيها محمد جرار؟",
+        "SELECT case_number FROM entities WHERE defendant_lawyer::text LIKE '%محمد جرار%';",
+    ),
+    (
+        "كم عدد القضايا التي ترست العالمية مدعية فيها؟",
+        "SELECT COUNT(*) FROM entities WHERE plaintiff::text LIKE '%ترست%';",
+    ),
+    (
+        "كم عدد قضايا القاضي أحمد المغني؟",
+        "SELECT COUNT(*) FROM entities WHERE judge::text LIKE '%أحمد المغني%';",
+    ),
+    (
+        "ما هو الحكم في القضية 413/2019؟",
+        "SELECT verdict FROM entities WHERE case_number = '413/2019';",
+    ),
+    (
+        "ما هي أبكر قضية من حيث التاريخ؟",
+        "SELECT case_number, judgment_date FROM entities WHERE judgment_date IS NOT NULL AND judgment_date != '' AND judgment_date LIKE '%/%' ORDER BY CASE WHEN replace(judgment_date, ' ', '') ~ '^\\d{4}' THEN to_date(replace(judgment_date, ' ', ''), 'YYYY/MM/DD') ELSE to_date(replace(judgment_date, ' ', ''), 'DD/MM/YYYY') END ASC LIMIT 1;",
+    ),
+    (
+        "ابحث عن علاقات أحمد",
+        "SELECT * FROM entity_relationships WHERE from_entity LIKE '%أحمد%' OR to_entity LIKE '%أحمد%';",
+    ),
+]
+
+
+def format_examples(examples: Sequence[Tuple[str, str]]) -> str:
+    return EXAMPLES_HEADER + "\n".join(f"س: {question}\nج: {sql}\n" for question, sql in examples)
+
+
+def _grams(text: str, ngram_range: Tuple[int, int]) -> Counter:
+    text = re.sub(r'\d+', '0', fold_arabic(normalize_question(text)))
+    grams = Counter()
+    # Pad with spaces so that word starts and ends form their own n-grams
+    for word in text.split():
+        word = f" {word} "
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            grams.update(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+class FewShotExampleStore:
+    def __init__(
+        self,
+        examples: Sequence[Tuple[str, str]] = SQL_EXAMPLES,
+        ngram_range: Tuple[int, int] = (2, 4),
+    ):
+        self.examples = list(examples)
+        self.ngram_range = ngram_range
+        grams = [_grams(question, ngram_range) for question, _ in self.examples]
+        df = Counter(g for counts in grams for g in counts)
+        n = len(self.examples)
+        # Smoothed idf, as in scikit-learn's TfidfVectorizer
+        self._idf = {g: math.log((1 + n) / (1 + count)) + 1 for g, count in df.items()}
+        self._vectors = [self._vector(counts) for counts in grams]
+
+    def _vector(self, counts: Counter) -> Dict[str, float]:
+        vector = {g: (1 + math.log(tf)) * self._idf[g] for g, tf in counts.items() if g in self._idf}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {g: w / norm for g, w in vector.items()}
+
+    def top_k(self, question: str, k: int, exclude: Optional[int] = None) -> List[Tuple[str, str]]:
+        """The ``k`` examples most similar to ``question``, most similar last.
+
+        ``exclude`` leaves one example out (used by the offline benchmark).
+        """
+        query = self._vector(_grams(question, self.ngram_range))
+        scored = [
+            (sum(w * vector.get(g, 0.0) for g, w in query.items()), i)
+            for i, vector in enumerate(self._vectors) if i != exclude
+        ]
+        best = sorted(scored, reverse=True)[:k]
+        # Closest example right before the question, where the model weighs it most
+        return [self.examples[i] for _, i in reversed(best)]
@@ -0,0 +1,206 @@
+"""
+Rule-based text-to-SQL fast path.
+
+Most /api/db-query questions follow the same handful of shapes as the
+few-shot examples in ``get_sql_from_llm``: a field of one case, a count
+inside one case, cases on a date, cases citing an article, cases of a judge
+or party. Each shape is a compiled pattern over the normalised question.
+A match becomes a parameterised SQL template and its bind parameters in
+microseconds. Questions that match no rule go to the LLM unchanged.
+
+Patterns are written against the folded spelling (see ``fold_arabic``), so
+they do not care about hamza forms, taa marbuta or alef maqsura. Names are
+bound from the question as the user wrote it.
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_DIACRITICS = re.compile(r'[\u064B-\u065F\u0670\u0640]')  # tashkeel + tatweel
+_PUNCTUATION = re.compile(r'[؟?!.,،:؛"«»]+$|^[؟?!.,،:؛"«»]+')
+_WHITESPACE = re.compile(r'\s+')
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+# One character to one character, so spans in the folded text are spans in the original
+_FOLD = str.maketrans("أإآٱةى", "ااااهي")
+
+_CASE = r'(?P<case_number>\d{1,6}\s*/\s*\d{4})'
+_DATE = r'(?P<judgment_date>\d{1,2}\s*/\s*\d{1,2}\s*/\s*\d{4}|\d{4}\s*/\s*\d{1,2}\s*/\s*\d{1,2})'
+# Words that end a name and start a qualifier ("... في سنة 2021", "... وكانت مدنية").
+# A question with a qualifier is left to the LLM rather than bound into the LIKE.
+_QUALIFIERS = (
+    "في", "من", "عن", "علي", "الي", "مع", "ضد", "او", "و", "التي", "الذي", "اللتي",
+    "كان", "كانت", "وكان", "وكانت", "سنه", "عام", "لسنه", "لعام", "خلال", "منذ",
+    "بين", "قبل", "بعد", "حيث", "بتاريخ", "تاريخ", "مدنيه", "جزائيه", "المدنيه", "الجزائيه",
+)
+# Role and field words that start a second clause when "و" is attached ("... والقاضي محمد")
+_ROLES = (
+    "القاضي", "القضاه", "المدعي", "المدعين", "المدعون", "محامي", "المحامي",
+    "المحكمه", "القضيه", "القضايا", "الحكم", "القرار",
+)
+# One to five words without digits, none of them a qualifier or و + qualifier/role.
+# Names that merely start with و (وليد, وائل) are still names.
+_NAME_WORD = (
+    r'(?!(?:' + "|".join(_QUALIFIERS) + r')(?:\s|$))'
+    r'(?!و(?:' + "|".join(_QUALIFIERS + _ROLES) + r')(?:\s|$))'
+    r'[^\s\d]+'
+)
+_NAME = r'(?P<name>' + _NAME_WORD + r'(?:\s' + _NAME_WORD + r'){0,4})'
+_CASE_REF = r'(?:في\s+)?(?:ال)?(?:قضيه\s+)?(?:رقم\s+)?' + _CASE
+
+# Field wording -> column, longest wording first so "محامي المدعي" wins over "المدعي"
+_CASE_FIELDS = {
+    "محامي المدعي عليهم": "defendant_lawyer",
+    "محامي المدعي عليه": "defendant_lawyer",
+    "محامو المدعي عليه": "defendant_lawyer",
+    "محامي المدعين": "plaintiff_lawyer",
+    "محامي المدعي": "plaintiff_lawyer",
+    "المدعي عليهم": "defendant",
+    "المدعي عليه": "defendant",
+    "المدعين": "plaintiff",
+    "المدعون": "plaintiff",
+    "المدعي": "plaintiff",
+    "تاريخ الحكم": "judgment_date",
+    "رئيس الهيئه": "chief_judge",
+    "اسم المحكمه": "court_name",
+    "المحكمه": "court_name",
+    "نوع القضيه": "case_type",
+    "القضاه": "judge",
+    "القاضي": "judge",
+    "الحكم": "verdict",
+    "القرار": "decision",
+}
+_COUNTED_FIELDS = {
+    "المواد القانونيه": "legal_articles",
+    "المدعي عليهم": "defendant",
+    "المدعين": "plaintiff",
+    "القضاه": "judge",
+}
+
+
+def fold_arabic(text: str) -> str:
+    """Letter-level folding used for matching; keeps the length of ``text``."""
+    return text.translate(_FOLD)
+
+
+def normalize_question(question: str) -> str:
+    """Strip diacritics, tatweel and edge punctuation, unify digits and whitespace."""
+    question = _DIACRITICS.sub('', question or '').translate(_DIGITS)
+    question = _WHITESPACE.sub(' ', question).strip()
+    return _PUNCTUATION.sub('', question).strip()
+
+
+def _compact(value: str) -> str:
+    return re.sub(r'\s+', '', value)
+
+
+def _contains(value: str) -> str:
+    return f"%{value.strip()}%"
+
+
+# (name, pattern over the folded question, SQL template, slot -> bind parameters)
+_Rule = Tuple[str, "re.Pattern", str, Callable[[Dict[str, str]], Dict[str, Any]]]
+_RULES: List[_Rule] = []
+
+
+def _rule(name: str, pattern: str, sql: str, params: Callable[[Dict[str, str]], Dict[str, Any]] = None):
+    _RULES.append((name, re.compile(f'^{pattern}$'), sql, params or (lambda slots: {})))
+
+
+def _by_case(slots: Dict[str, str]) -> Dict[str, Any]:
+    return {"case_number": _compact(slots["case_number"])}
+
+
+_rule(
+    "count_cases",
+    r'(?:كم عدد القضايا|ما عدد القضايا)(?: الموجوده| الكلي| في قاعده البيانات)?',
+    "SELECT COUNT(*) FROM entities",
+)
+_rule(
+    "count_courts",
+    r'(?:كم عدد|ما عدد) المحاكم(?: المختلفه)?',
+    "SELECT COUNT(DISTINCT court_name) FROM entities",
+)
+for _wording, _column in _CASE_FIELDS.items():
+    _rule(
+        f"case_{_column}",
+        r'(?:من|ما|ماهو|ماهي|من هو|من هي|من هم|ما هو|ما هي|ما هم) ' + re.escape(_wording) + r' ' + _CASE_REF,
+        f"SELECT {_column} FROM entities WHERE case_number = :case_number",
+        _by_case,
+    )
+for _wording, _column in _COUNTED_FIELDS.items():
+    _rule(
+        f"count_case_{_column}",
+        r'(?:كم|ما) عدد ' + re.escape(_wording) + r' ' + _CASE_REF,
+        f"SELECT jsonb_array_length({_column}::jsonb) FROM entities WHERE case_number = :case_number",
+        _by_case,
+    )
+_rule(
+    "case_legal_articles",
+    r'(?:ما هي|ماهي|ما) المواد القانونيه(?: المستند اليها| المذكوره)? ' + _CASE_REF,
+    "SELECT jsonb_array_elements_text(legal_articles::jsonb) FROM entities WHERE case_number = :case_number",
+    _by_case,
+)
+_rule(
+    "cases_by_type",
+    r'(?:ما هو|ما هي|ماهو|ماهي|اعرض|اذكر) (?:رقم |ارقام )?(?:القضيه|القضايا) (?P<case_type>الجزائيه|المدنيه)',
+    "SELECT case_number FROM entities WHERE case_type = :case_type",
+    lambda slots: {"case_type": "جزائي" if "جزائ" in slots["case_type"] else "مدني"},
+)
+_rule(
+    "count_cases_on_date",
+    r'(?:كم|ما) عدد القضايا (?:الصادره |المحكوم فيها )?(?:بتاريخ|في تاريخ|يوم) ' + _DATE,
+    "SELECT COUNT(*) FROM entities WHERE replace(judgment_date, ' ', '') = :judgment_date",
+    lambda slots: {"judgment_date": _compact(slots["judgment_date"])},
+)
+_rule(
+    "cases_on_date",
+    r'(?:ما هي|ماهي|اعرض|اذكر) القضايا (?:الصادره |المحكوم فيها )?(?:بتاريخ|في تاريخ|يوم) ' + _DATE,
+    "SELECT case_number FROM entities WHERE replace(judgment_date, ' ', '') = :judgment_date",
+    lambda slots: {"judgment_date": _compact(slots["judgment_date"])},
+)
+_rule(
+    "cases_citing_article",
+    r'(?:ما هي|ماهي|اعرض|اذكر) القضايا التي (?:استندت|تستند|استشهدت|ذكرت|طبقت) '
+    r'(?:الي |علي )?(?:للماده|الماده|بالماده) (?:رقم )?(?P<article>\d+)',
+    "SELECT case_number FROM entities WHERE legal_articles::text LIKE :article",
+    lambda slots: {"article": _contains(slots["article"])},
+)
+_rule(
+    "count_judge_cases",
+    r'(?:كم|ما) عدد قضايا القاضي ' + _NAME,
+    "SELECT COUNT(*) FROM entities WHERE judge::text LIKE :name",
+    lambda slots: {"name": _contains(slots["name"])},
+)
+_rule(
+    "count_plaintiff_cases",
+    r'(?:كم|ما) عدد القضايا التي ' + _NAME + r' (?:مدعيه|مدعي) فيها',
+    "SELECT COUNT(*) FROM entities WHERE plaintiff::text LIKE :name",
+    lambda slots: {"name": _contains(slots["name"])},
+)
+_rule(
+    "count_defendant_cases",
+    r'(?:كم|ما) عدد القضايا التي ' + _NAME + r' (?:مدعي عليها|مدعي عليه) فيها',
+    "SELECT COUNT(*) FROM entities WHERE defendant::text LIKE :name",
+    lambda slots: {"name": _contains(slots["name"])},
+)
+for _wording, _column in (("محامي المدعي عليه", "defendant_lawyer"), ("محامي المدعي", "plaintiff_lawyer")):
+    _rule(
+        f"cases_by_{_column}",
+        r'(?:ما هي|ماهي|اعرض|اذكر) القضايا التي ' + re.escape(_wording) + r' فيها ' + _NAME,
+        f"SELECT case_number FROM entities WHERE {_column}::text LIKE :name",
+        lambda slots: {"name": _contains(slots["name"])},
+    )
+
+
+def match_sql_rule(question: str) -> Optional[Tuple[str, Dict[str, Any], str]]:
+    """``(sql, params, rule_name)`` for a question of a known shape, else None."""
+    surface = normalize_question(question)
+    folded = fold_arabic(surface)
+    for name, pattern, sql, params in _RULES:
+        match = pattern.match(folded)
+        if match is None:
+            continue
+        # Slot values come from the unfolded text (names are stored with hamzas)
+        slots = {slot: surface[match.start(slot):match.end(slot)] for slot in match.groupdict()}
+        return sql, params(slots), name
+    return None
@@ -0,0 +1,147 @@
+"""
+Benchmark the sparse BM25 engine against rank_bm25.BM25Okapi.
+
+Synthetic mode (default) builds Zipf-distributed corpora of 10k / 100k / 1M
+chunks and reports build time and per-query latency. BM25Okapi is only run up
+to --okapi-max documents because it is too slow beyond that.
+
+--chroma mode loads the real legal_documents collection, tokenizes it with
+_arabic_tokenize and checks that both engines return the same scores.
+
+Usage:
+    python scripts/bench_bm25.py
+    python scripts/bench_bm25.py --sizes 10000 100000 --queries 200
+    python scripts/bench_bm25.py --chroma
+"""
+
+import sys
+import os
+import argparse
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.rag.bm25 import SparseBM25
+from app.rag.vector_store import _arabic_tokenize
+
+try:
+    from rank_bm25 import BM25Okapi
+except ImportError:
+    BM25Okapi = None
+
+
+def synthetic_corpus(n_docs: int, vocab_size: int = 50000, avg_len: int = 120, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    vocab = [f"t{i}" for i in range(vocab_size)]
+    lengths = np.clip(rng.poisson(avg_len, n_docs), 5, None)
+    term_ids = np.minimum(rng.zipf(1.2, int(lengths.sum())), vocab_size) - 1
+    corpus = []
+    start = 0
+    for length in lengths:
+        corpus.append([vocab[t] for t in term_ids[start:start + length]])
+        start += length
+    return corpus
+
+
+def sample_queries(corpus, n_queries: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for doc_idx in rng.integers(0, len(corpus), n_queries):
+        doc = corpus[doc_idx]
+        picks = rng.integers(0, len(doc), min(5, len(doc)))
+        queries.append([doc[i] for i in picks])
+    return queries
+
+
+def time_queries(engine, queries, k: int = 50):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        scores = engine.get_scores(q)
+        SparseBM25.top_k(scores, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.mean(latencies), np.percentile(latencies, 95)
+
+
+def compare_scores(sparse_engine, okapi_engine, queries):
+    max_diff = 0.0
+    for q in queries:
+        a = sparse_engine.get_scores(q)
+        b = okapi_engine.get_scores(q)
+        max_diff = max(max_diff, float(np.max(np.abs(a - b))) if a.size else 0.0)
+    return max_diff
+
+
+def run_synthetic(sizes, n_queries, okapi_max):
+    print(f"{'docs':>10} | {'engine':<10} | {'build s':>8} | {'mean ms':>8} | {'p95 ms':>8}")
+    print("-" * 58)
+    for n_docs in sizes:
+        corpus = synthetic_corpus(n_docs)
+        queries = sample_queries(corpus, n_queries)
+
+        start = time.perf_counter()
+        sparse_engine = SparseBM25(corpus)
+        build_s = time.perf_counter() - start
+        mean_ms, p95_ms = time_queries(sparse_engine, queries)
+        print(f"{n_docs:>10,} | {'sparse':<10} | {build_s:>8.2f} | {mean_ms:>8.2f} | {p95_ms:>8.2f}")
+
+        if BM25Okapi is not None and n_docs <= okapi_max:
+            start = time.perf_counter()
+            okapi = BM25Okapi(corpus)
+            build_s = time.perf_counter() - start
+            mean_ms, p95_ms = time_queries(okapi, queries)
+            print(f"{n_docs:>10,} | {'okapi':<10} | {build_s:>8.2f} | {mean_ms:>8.2f} | {p95_ms:>8.2f}")
+            print(f"{'':>10}   max |score diff| = {compare_scores(sparse_engine, okapi, queries[:50]):.2e}")
+
+
+def run_chroma(n_queries):
+    import chromadb
+
+    if BM25Okapi is None:
+        print("rank_bm25 is required for the parity check: pip install rank-bm25")
+        return
+
+    client = chromadb.PersistentClient(path="./chroma_db")
+    collection = client.get_or_create_collection(name="legal_documents")
+    docs = collection.get(include=["documents"]).get("documents", [])
+    if not docs:
+        print("The legal_documents collection is empty. Run scripts/ingest_docx.py first.")
+        return
+
+    corpus = [_arabic_tokenize(d) for d in docs]
+    queries = sample_queries(corpus, n_queries)
+    sparse_engine = SparseBM25(corpus)
+    okapi = BM25Okapi(corpus)
+
+    max_diff = compare_scores(sparse_engine, okapi, queries)
+    same_top = sum(
+        list(SparseBM25.top_k(sparse_engine.get_scores(q), 10)) == list(np.argsort(okapi.get_scores(q))[::-1][:10])
+        for q in queries
+    )
+    print(f"Corpus: {len(docs)} chunks, {len(sparse_engine.vocab)} terms")
+    print(f"Max |score diff| over {len(queries)} queries: {max_diff:.2e}")
+    print(f"Identical top-10 order: {same_top}/{len(queries)} (ties may swap)")
+    print(f"Sparse latency mean/p95 ms: {time_queries(sparse_engine, queries)}")
+    print(f"Okapi  latency mean/p95 ms: {time_queries(okapi, queries)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SparseBM25 vs rank_bm25.BM25Okapi")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--okapi-max", type=int, default=100_000,
+                        help="Largest corpus on which BM25Okapi is also run.")
+    parser.add_argument("--chroma", action="store_true",
+                        help="Check score parity on the real ChromaDB corpus instead.")
+    args = parser.parse_args()
+
+    if args.chroma:
+        run_chroma(args.queries)
+    else:
+        run_synthetic(args.sizes, args.queries, args.okapi_max)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the PyTorch and int8 ONNX encoder backends on the legislation corpus.
+
+Reports for each backend:
+  - ingestion throughput (chunks/s) on a sample of stored chunks
+  - single-query latency (mean / p95)
+and, for ONNX vs PyTorch:
+  - mean cosine between the two embeddings of the same text
+  - recall@k: overlap of each query's top-k chunks (brute force over the sample)
+
+Queries come from the RAG evaluation dataset when present, otherwise from the
+first words of random chunks.
+
+Usage:
+    python scripts/bench_encoder.py --chunks 2000 --queries 100 --k 10
+"""
+
+import sys
+import os
+import argparse
+import json
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import chromadb
+
+from app.rag.encoders import load_encoder
+
+
+def load_sample(n_chunks: int, n_queries: int, dataset_path: str, seed: int = 42):
+    client = chromadb.PersistentClient(path="./chroma_db")
+    collection = client.get_or_create_collection(name="legal_documents")
+    docs = collection.get(include=["documents"]).get("documents", [])
+    rng = np.random.default_rng(seed)
+    docs = [docs[i] for i in rng.permutation(len(docs))[:n_chunks]]
+
+    if os.path.exists(dataset_path):
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            queries = [item["question"] for item in json.load(f)][:n_queries]
+    else:
+        queries = [" ".join(docs[i].split()[:12]) for i in rng.integers(0, len(docs), n_queries)]
+    return docs, queries
+
+
+def bench_backend(name: str, model_name: str, docs, queries):
+    start = time.perf_counter()
+    encoder = load_encoder(model_name, backend=name)
+    encoder.encode(["تهيئة"])
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    doc_emb = encoder.encode(docs)
+    ingest_s = time.perf_counter() - start
+
+    latencies = []
+    query_emb = []
+    for q in queries:
+        start = time.perf_counter()
+        query_emb.append(encoder.encode([q])[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    print(f"[{name}] load {load_s:.1f}s | ingest {len(docs) / ingest_s:.1f} chunks/s | "
+          f"query mean {np.mean(latencies):.1f} ms, p95 {np.percentile(latencies, 95):.1f} ms")
+    return doc_emb, np.vstack(query_emb)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark torch vs int8 ONNX encoder backends")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dataset", default="rag_eval_dataset.json")
+    args = parser.parse_args()
+
+    docs, queries = load_sample(args.chunks, args.queries, args.dataset)
+    if not docs:
+        print("The legal_documents collection is empty. Run scripts/ingest_docx.py first.")
+        return
+    print(f"Sample: {len(docs)} chunks, {len(queries)} queries\n")
+
+    torch_docs, torch_queries = bench_backend("torch", args.model, docs, queries)
+    onnx_docs, onnx_queries = bench_backend("onnx", args.model, docs, queries)
+
+    agreement = float(np.mean(np.sum(torch_docs * onnx_docs, axis=1)))
+    k = min(args.k, len(docs))
+    torch_top = np.argsort(-(torch_queries @ torch_docs.T), axis=1)[:, :k]
+    onnx_top = np.argsort(-(onnx_queries @ onnx_docs.T), axis=1)[:, :k]
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(torch_top, onnx_top)])
+
+    print(f"\nMean cosine(torch, onnx) per chunk: {agreement:.4f}")
+    print(f"Recall@{k} of ONNX top-{k} vs PyTorch top-{k}: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
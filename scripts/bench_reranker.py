@@ -0,0 +1,117 @@
+"""
+Measure what the cross-encoder reranker costs and saves on /api/ask.
+
+For each question it compares:
+  - baseline: hybrid RRF search, top 10 chunks (the endpoint's default)
+  - reranked: RRF top --candidates, re-scored by the cross-encoder, top --top-n
+and reports retrieval latency (cold and warm score cache), prompt context
+tokens (counted with the encoder's tokenizer) and, with --llm, Gemini latency
+for both prompts so the net effect per request is visible.
+
+Questions come from the RAG evaluation dataset.
+
+Usage:
+    python scripts/bench_reranker.py --model cross-encoder/mmarco-mMiniLMv2-L12-H384-v1
+    python scripts/bench_reranker.py --model BAAI/bge-reranker-v2-m3 --top-n 4 --llm
+"""
+
+import sys
+import os
+import argparse
+import json
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.rag import reranker as reranker_module
+from app.rag.vector_store import VectorStoreManager
+
+
+def build_context(results) -> str:
+    # Same layout as the prompt built in app/main.py
+    return "\n\n".join(
+        f"--- نص قانوني من تشريع: {meta.get('filename', 'Unknown')} ---\n{doc}"
+        for doc, meta in zip(results["documents"][0], results["metadatas"][0])
+    )
+
+
+def timed_search(vector_store, question, n_results, rerank):
+    start = time.perf_counter()
+    results = vector_store.search(question, n_results=n_results, rerank=rerank)
+    return results, (time.perf_counter() - start) * 1000
+
+
+def llm_ms(context: str, question: str) -> float:
+    import google.generativeai as genai
+
+    start = time.perf_counter()
+    genai.GenerativeModel("gemini-2.5-flash").generate_content(
+        f"النصوص القانونية:\n{context}\n\nسؤال المستخدم:\n{question}"
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def summary(values):
+    return f"mean {np.mean(values):8.1f} | p95 {np.percentile(values, 95):8.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cross-encoder reranking stage")
+    parser.add_argument("--model", default=reranker_module.RERANKER_MODEL or "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    parser.add_argument("--candidates", type=int, default=reranker_module.RERANK_CANDIDATES)
+    parser.add_argument("--top-n", type=int, default=reranker_module.RERANK_TOP_N)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dataset", default="rag_eval_dataset.json")
+    parser.add_argument("--llm", action="store_true", help="Also time Gemini on both prompts.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.llm:
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GEMINI"))
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        questions = [item["question"] for item in json.load(f)][:args.queries]
+
+    vector_store = VectorStoreManager(reranker_model=args.model, rerank_candidates=args.candidates)
+    vector_store.warmup()
+    tokenizer = vector_store.encoder.tokenizer
+
+    rows = {"base_ms": [], "cold_ms": [], "warm_ms": [], "base_tok": [], "rerank_tok": [],
+            "base_llm": [], "rerank_llm": []}
+    for question in questions:
+        base, ms = timed_search(vector_store, question, 10, rerank=False)
+        rows["base_ms"].append(ms)
+        reranked, ms = timed_search(vector_store, question, args.top_n, rerank=True)
+        rows["cold_ms"].append(ms)
+        _, ms = timed_search(vector_store, question, args.top_n, rerank=True)
+        rows["warm_ms"].append(ms)
+
+        base_ctx, rerank_ctx = build_context(base), build_context(reranked)
+        rows["base_tok"].append(len(tokenizer(base_ctx)["input_ids"]))
+        rows["rerank_tok"].append(len(tokenizer(rerank_ctx)["input_ids"]))
+        if args.llm:
+            rows["base_llm"].append(llm_ms(base_ctx, question))
+            rows["rerank_llm"].append(llm_ms(rerank_ctx, question))
+
+    print(f"Reranker: {args.model} ({args.candidates} candidates -> top {args.top_n}), {len(questions)} questions")
+    print(f"Retrieval ms, baseline top-10 : {summary(rows['base_ms'])}")
+    print(f"Retrieval ms, reranked (cold) : {summary(rows['cold_ms'])}")
+    print(f"Retrieval ms, reranked (warm) : {summary(rows['warm_ms'])}")
+    print(f"Context tokens, baseline      : {summary(rows['base_tok'])}")
+    print(f"Context tokens, reranked      : {summary(rows['rerank_tok'])}")
+    saved = 1 - np.sum(rows["rerank_tok"]) / max(np.sum(rows["base_tok"]), 1)
+    print(f"Prompt context tokens saved   : {saved:.1%}")
+    if args.llm:
+        print(f"LLM ms, baseline              : {summary(rows['base_llm'])}")
+        print(f"LLM ms, reranked              : {summary(rows['rerank_llm'])}")
+        net = (np.mean(rows["cold_ms"]) + np.mean(rows["rerank_llm"])) - (np.mean(rows["base_ms"]) + np.mean(rows["base_llm"]))
+        print(f"Net change per request (cold) : {net:+.1f} ms")
+    print(f"Score cache: {vector_store.reranker.stats()}")
+
+
+if __name__ == "__main__":
+    main()
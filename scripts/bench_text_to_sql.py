@@ -0,0 +1,113 @@
+"""
+Compare the static text-to-SQL prompt (every few-shot example) with the
+retrieved one (only the k most similar examples).
+
+For each question both prompts are sent to Groq. The script reports
+prompt tokens (from the API usage), LLM latency and SQL accuracy. Accuracy
+is an exact match after whitespace/case folding, and with --execute also
+a match of the result rows on the configured database.
+
+Without --dataset the hand-written examples are used leave-one-out: each
+example question is asked with its own pair removed from both prompts.
+A dataset is a JSON list of {"question": ..., "sql": ...}.
+
+Usage:
+    python scripts/bench_text_to_sql.py --k 6
+    python scripts/bench_text_to_sql.py --k 4 --dataset sql_eval.json --execute
+"""
+
+import sys
+import os
+import argparse
+import json
+import re
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import text
+
+from app.chat_utils import MODEL_NAME, TEXT_SQL_FEW_SHOT_K, build_system_prompt, client, extract_sql
+from app.database import engine
+from app.sql_examples import SQL_EXAMPLES
+
+
+def normalize_sql(sql: str) -> str:
+    return re.sub(r'\s+', ' ', (sql or "").strip().rstrip(';')).lower()
+
+
+def result_rows(sql: str):
+    try:
+        with engine.connect() as connection:
+            rows = connection.execute(text(sql)).fetchall()
+        return sorted(repr(tuple(row)) for row in rows)
+    except Exception:
+        return None
+
+
+def ask(question: str, k: int, exclude):
+    start = time.perf_counter()
+    system_prompt = build_system_prompt(question, k=k, exclude=exclude)
+    retrieval_ms = (time.perf_counter() - start) * 1000
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"حول هذا السؤال إلى SQL: {question}"},
+    ]
+    start = time.perf_counter()
+    response = client.chat.completions.create(model=MODEL_NAME, messages=messages)
+    llm_ms = (time.perf_counter() - start) * 1000
+    sql = extract_sql(response.choices[0].message.content.strip())
+    return sql, response.usage.prompt_tokens, llm_ms, retrieval_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark static vs retrieved few-shot text-to-SQL prompts")
+    parser.add_argument("--k", type=int, default=TEXT_SQL_FEW_SHOT_K or 6)
+    parser.add_argument("--dataset", default=None, help="JSON list of {question, sql}; default: leave-one-out examples.")
+    parser.add_argument("--execute", action="store_true", help="Also compare result rows on the database.")
+    args = parser.parse_args()
+
+    if client is None:
+        print("GROQ_API_KEY is not configured.")
+        return
+
+    if args.dataset:
+        with open(args.dataset, "r", encoding="utf-8") as f:
+            items = [(item["question"], item["sql"], None) for item in json.load(f)]
+    else:
+        items = [(question, sql, i) for i, (question, sql) in enumerate(SQL_EXAMPLES)]
+
+    modes = {"static (all examples)": 0, f"retrieved (k={args.k})": args.k}
+    rows = {name: {"tokens": [], "llm_ms": [], "retrieval_ms": [], "exact": 0, "executed": 0} for name in modes}
+    for question, gold, exclude in items:
+        gold_rows = result_rows(gold) if args.execute else None
+        for name, k in modes.items():
+            try:
+                sql, tokens, llm_ms, retrieval_ms = ask(question, k, exclude)
+            except Exception as e:
+                print(f"  [{name}] {question}: {e}")
+                continue
+            row = rows[name]
+            row["tokens"].append(tokens)
+            row["llm_ms"].append(llm_ms)
+            row["retrieval_ms"].append(retrieval_ms)
+            row["exact"] += normalize_sql(sql) == normalize_sql(gold)
+            if args.execute and gold_rows is not None:
+                row["executed"] += result_rows(sql) == gold_rows
+
+    print(f"Model: {MODEL_NAME}, {len(items)} questions")
+    for name, row in rows.items():
+        if not row["tokens"]:
+            continue
+        print(f"\n{name}")
+        print(f"  prompt tokens  : mean {np.mean(row['tokens']):7.0f}")
+        print(f"  LLM ms         : mean {np.mean(row['llm_ms']):7.0f} | p95 {np.percentile(row['llm_ms'], 95):7.0f}")
+        print(f"  example pick ms: mean {np.mean(row['retrieval_ms']):7.3f}")
+        print(f"  exact match    : {row['exact']}/{len(items)}")
+        if args.execute:
+            print(f"  result match   : {row['executed']}/{len(items)}")
+
+
+if __name__ == "__main__":
+    main()
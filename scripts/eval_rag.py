@@ -15,6 +15,7 @@ from dotenv import load_dotenv
 # Add project root to python path so we can import app.*
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.rag.context_packer import ContextPacker
 from app.rag.vector_store import VectorStoreManager
 import google.generativeai as genai
 
@@ -40,9 +41,24 @@ def load_dataset(dataset_path: str):
         return json.load(f)
 
 
-def run_rag_pipeline(vector_store: VectorStoreManager, question: str) -> dict:
-    """Runs the exact production RAG pipeline logic for a single question."""
-    results = vector_store.search(question, n_results=10)
+_context_packer = None
+
+
+def get_context_packer(vector_store: VectorStoreManager) -> ContextPacker:
+    global _context_packer
+    if _context_packer is None:
+        _context_packer = ContextPacker.from_encoder(vector_store.encoder)
+    return _context_packer
+
+
+def run_rag_pipeline(vector_store: VectorStoreManager, question: str, results: dict = None) -> dict:
+    """Runs the exact production RAG pipeline logic for a single question.
+
+    `results` may hold this question's slice of a `search_batch` call, in
+    which case retrieval is skipped.
+    """
+    if results is None:
+        results = vector_store.search(question, n_results=10)
 
     if not results['documents'] or not results['documents'][0]:
         return {
@@ -50,12 +66,10 @@ def run_rag_pipeline(vector_store: VectorStoreManager, question: str) -> dict:
             "answer": "لم أتمكن من العثور على أية تشريعات مرتبطة بسؤالك."
         }
 
-    contexts = results['documents'][0]
-
-    context_text = "\n\n".join([
-        f"--- نص قانوني من تشريع: {meta.get('filename', 'Unknown')} ---\n{doc}"
-        for doc, meta in zip(results['documents'][0], results['metadatas'][0])
-    ])
+    packed = get_context_packer(vector_store).pack(results['documents'][0], results['metadatas'][0])
+    # Evaluate against what the LLM actually saw
+    contexts = packed["blocks"]
+    context_text = packed["context"]
 
     prompt = f"""
 أنت مستشار قانوني فلسطيني ذكي ومحترف. 
@@ -81,11 +95,12 @@ def run_rag_pipeline(vector_store: VectorStoreManager, question: str) -> dict:
     return {"contexts": contexts, "answer": answer}
 
 
-def run_rag_pipeline_with_retry(vector_store: VectorStoreManager, question: str, max_retries: int = 3) -> dict:
+def run_rag_pipeline_with_retry(vector_store: VectorStoreManager, question: str, max_retries: int = 3,
+                                results: dict = None) -> dict:
     """Wrapper with exponential backoff on transient failures."""
     for attempt in range(max_retries):
         try:
-            return run_rag_pipeline(vector_store, question)
+            return run_rag_pipeline(vector_store, question, results)
         except Exception as e:
             err_str = str(e)
             print(f"  ⚠ Attempt {attempt+1} failed: {err_str[:120]}")
@@ -115,6 +130,12 @@ def generate_answers_for_dataset(dataset: list, limit: int = 50) -> list:
     print(f"  RAG Answer Generation — {total} questions")
     print(f"{'='*60}\n")
 
+    # Retrieve contexts for every question up front: one batched encoder pass,
+    # one Chroma query and one BM25 product instead of one of each per question
+    start_time = time.time()
+    batch_results = vector_store.search_batch([item["question"] for item in subset], n_results=10)
+    print(f"Retrieved contexts for {total} questions in {time.time() - start_time:.1f}s\n")
+
     for i, item in enumerate(subset, 1):
         question = item["question"]
         ground_truth = item["ground_truth"]
@@ -123,7 +144,8 @@ def generate_answers_for_dataset(dataset: list, limit: int = 50) -> list:
 
         start_time = time.time()
         try:
-            rag_output = run_rag_pipeline_with_retry(vector_store, question)
+            results = {key: [values[i - 1]] for key, values in batch_results.items()}
+            rag_output = run_rag_pipeline_with_retry(vector_store, question, results=results)
             contexts = rag_output["contexts"]
             answer = rag_output["answer"]
 
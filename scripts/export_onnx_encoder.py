@@ -0,0 +1,34 @@
+"""
+Export the RAG embedding model to an int8-quantized ONNX model.
+
+Requires: pip install optimum[onnxruntime]
+
+Usage:
+    python scripts/export_onnx_encoder.py
+    python scripts/export_onnx_encoder.py --model BAAI/bge-m3 --output ./models/bge-m3-onnx-int8
+
+Then start the API with RAG_ENCODER_BACKEND=onnx.
+"""
+
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.rag.encoders import ONNX_MODEL_DIR, export_onnx_int8
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to int8 ONNX")
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+
+    print(f"Exporting {args.model} → {args.output} (this downloads and converts the model)...")
+    export_onnx_int8(args.model, args.output)
+    print("Done. Select it with RAG_ENCODER_BACKEND=onnx")
+
+
+if __name__ == "__main__":
+    main()
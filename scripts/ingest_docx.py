@@ -1,5 +1,7 @@
 import sys
 import os
+import hashlib
+import json
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -7,6 +9,12 @@ from app.rag.document_loader import DocumentLoader
 from app.rag.text_processor import ArabicTextProcessor
 from app.rag.vector_store import VectorStoreManager
 
+# filename -> {"sha256": file hash, "chunks": [[chunk_id, chunk_index, article_number], ...]}
+MANIFEST_PATH = "./chroma_db/ingest_manifest.json"
+MANIFEST_VERSION = 2
+# Chunks buffered before they are embedded, while later files are still parsing
+INGEST_FLUSH_CHUNKS = 2000
+
 def extract_doc_context(content: str) -> str:
     # Extract the first 3 non-empty lines for document context/title
     lines = [line.strip() for line in content.split('\n') if line.strip()]
@@ -16,12 +24,70 @@ def extract_doc_context(content: str) -> str:
         if any(kw in line for kw in ["رئيس دولة", "رئيس اللجنة", "قررنا", "مادة", "المادة", "ماده", "الماده"]):
             break
         context_lines.append(line)
-    
+
     return " - ".join(context_lines).strip()
 
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest["files"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+def save_manifest(files: dict):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": files}, f, ensure_ascii=False)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def chunk_file(doc: dict, processor: ArabicTextProcessor):
+    """(chunk_id, text, chunk_index, article_number) per article, with ids derived from the chunk content."""
+    # Extract title/number context from the original raw content
+    doc_context = extract_doc_context(doc["content"])
+
+    # Split into articles with raw context prepended (no normalization)
+    articles = processor.split_into_numbered_articles(doc["content"], doc_context=doc_context)
+
+    safe_filename = "".join(x for x in doc["filename"] if x.isalnum() or x in "._-")
+    chunks = []
+    seen = {}
+    chunk_counter = 1
+    for article, article_number in articles:
+        if not article.strip():
+            continue
+        # Content-addressed id: an edit elsewhere in the file does not shift it
+        chunk_id = f"{safe_filename}_{hashlib.sha256(article.encode('utf-8')).hexdigest()[:16]}"
+        repeat = seen.get(chunk_id, 0)
+        seen[chunk_id] = repeat + 1
+        if repeat:
+            chunk_id = f"{chunk_id}_{repeat}"
+        chunks.append((chunk_id, article, chunk_counter, article_number))
+        chunk_counter += 1
+    return chunks
+
+def stored_chunks(vector_store: VectorStoreManager, filename: str) -> dict:
+    """chunk_id -> [chunk_index, article_number] already in Chroma for a file the manifest does not know."""
+    # Covers stores built before the manifest existed (positional ids)
+    existing = vector_store.collection.get(where={"filename": filename}, include=["metadatas"])
+    return {
+        chunk_id: [(meta or {}).get("chunk_index"), (meta or {}).get("article_number")]
+        for chunk_id, meta in zip(existing.get("ids", []), existing.get("metadatas") or [])
+    }
+
 def main():
     docs_dir = "./legal_docx"
-    
+
     if not os.path.exists(docs_dir):
         os.makedirs(docs_dir)
         print(f"Created {docs_dir}. Please place .docx or .txt files there and run again.")
@@ -35,52 +101,90 @@ def main():
     if "--clear" in sys.argv:
         print("Clearing existing RAG ChromaDB collection 'legal_documents'...")
         try:
-            vector_store.client.delete_collection("legal_documents")
-            # Recreate it
-            vector_store.collection = vector_store.client.get_or_create_collection(name="legal_documents")
+            # Drops the collection and the BM25 cache/delta files together
+            vector_store.clear()
+            if os.path.exists(MANIFEST_PATH):
+                os.remove(MANIFEST_PATH)
             print("Collection cleared successfully.")
         except Exception as e:
             print(f"Warning: Could not clear collection: {e}")
 
-    raw_docs = loader.load_all_files()
-    if not raw_docs:
+    filenames = loader.list_files()
+    if not filenames:
         print("No .docx or .txt files found in directory.")
         return
 
+    # A manifest describing an empty collection is stale
+    manifest = load_manifest() if vector_store.collection.count() else {}
+    new_manifest = {}
+
     chunks_to_insert = []
     metadatas_to_insert = []
     ids_to_insert = []
-    doc_counter = 1
-
-    for doc in raw_docs:
-        # Extract title/number context from the original raw content
-        doc_context = extract_doc_context(doc["content"])
-        
-        # Split into articles with raw context prepended (no normalization)
-        articles = processor.split_into_articles(doc["content"], doc_context=doc_context)
-        
-        chunk_counter = 1
-        for article in articles:
-            if not article.strip():
-                continue
-                
-            safe_filename = "".join(x for x in doc["filename"] if x.isalnum() or x in "._-")
-            chunk_id = f"{safe_filename}_chunk_{chunk_counter}"
-            chunks_to_insert.append(article)
-            metadatas_to_insert.append({
-                "filename": doc["filename"], 
-                "chunk_index": chunk_counter
-            })
-            ids_to_insert.append(chunk_id)
-            
-            chunk_counter += 1
-            
-        doc_counter += 1
+    moved_chunks = []
+    moved_metadatas = []
+    moved_ids = []
+    ids_to_delete = []
+    unchanged_files = 0
+    inserted = 0
+
+    digests = {}
+    for filename in sorted(filenames):
+        digest = file_sha256(os.path.join(docs_dir, filename))
+        entry = manifest.get(filename)
+        if entry and entry["sha256"] == digest:
+            new_manifest[filename] = entry
+            unchanged_files += 1
+        else:
+            digests[filename] = digest
+
+    # Files are parsed in worker processes and chunked/embedded as they arrive
+    for filename, doc in loader.iter_files(list(digests)):
+        entry = manifest.get(filename)
+        old = {cid: [idx, art] for cid, idx, art in entry["chunks"]} if entry else stored_chunks(vector_store, filename)
+        chunks = chunk_file(doc, processor) if doc else []
+
+        for chunk_id, article, chunk_index, article_number in chunks:
+            metadata = {"filename": filename, "chunk_index": chunk_index}
+            if article_number is not None:
+                # Feeds the (filename, article number) index used by search()
+                metadata["article_number"] = article_number
+            if chunk_id not in old:
+                chunks_to_insert.append(article)
+                metadatas_to_insert.append(metadata)
+                ids_to_insert.append(chunk_id)
+            elif old[chunk_id] != [chunk_index, article_number]:
+                moved_chunks.append(article)
+                moved_metadatas.append(metadata)
+                moved_ids.append(chunk_id)
+        current_ids = {chunk_id for chunk_id, _, _, _ in chunks}
+        ids_to_delete.extend(cid for cid in old if cid not in current_ids)
+        new_manifest[filename] = {
+            "sha256": digests[filename],
+            "chunks": [[cid, idx, art] for cid, _, idx, art in chunks],
+        }
 
+        if len(chunks_to_insert) >= INGEST_FLUSH_CHUNKS:
+            vector_store.add_documents(chunks_to_insert, metadatas_to_insert, ids_to_insert)
+            inserted += len(ids_to_insert)
+            chunks_to_insert, metadatas_to_insert, ids_to_insert = [], [], []
+
+    # Files that were removed from the directory
+    for filename, entry in manifest.items():
+        if filename not in new_manifest:
+            ids_to_delete.extend(chunk[0] for chunk in entry["chunks"])
+
+    vector_store.delete_documents(ids_to_delete)
     if chunks_to_insert:
         vector_store.add_documents(chunks_to_insert, metadatas_to_insert, ids_to_insert)
-        print(f"Successfully inserted {len(chunks_to_insert)} chunks from {len(raw_docs)} files.")
+        inserted += len(ids_to_insert)
+    vector_store.update_metadatas(moved_chunks, moved_metadatas, moved_ids)
+    if ids_to_delete or inserted or moved_ids:
+        vector_store.compact_bm25()
+    save_manifest(new_manifest)
+
+    print(f"Files: {len(filenames)} ({unchanged_files} unchanged, skipped).")
+    print(f"Chunks: {inserted} inserted, {len(moved_ids)} re-indexed, {len(ids_to_delete)} deleted.")
 
 if __name__ == "__main__":
     main()
-
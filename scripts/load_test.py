@@ -0,0 +1,101 @@
+"""
+Concurrent load test for the LLM-backed endpoints.
+
+Fires --requests requests at /api/ask (RAG path) or /api/extract with
+--concurrency in flight. Meanwhile a probe hits GET /api/metrics every
+--probe-interval seconds. When an endpoint blocks the event loop, the probe
+stalls for a whole LLM round trip and throughput stays near one request at
+a time per worker. Run it against the server before and after a change to
+compare.
+
+The same question is sent every time, so start the server with the answer
+cache disabled or every request after the first is a cache hit.
+
+Usage:
+    RAG_ANSWER_CACHE_SIZE=0 uvicorn app.main:app --port 8000    # one worker
+    python scripts/load_test.py --concurrency 1 --requests 10
+    python scripts/load_test.py --concurrency 16 --requests 64
+    python scripts/load_test.py --endpoint extract --concurrency 16
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+DEFAULT_QUESTION = "ما هي عقوبة السرقة في قانون العقوبات؟"
+DEFAULT_LAW_TEXT = "حكمت المحكمة في القضية رقم 563/2021 على المدعى عليه بغرامة مالية قدرها 500 دينار."
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, text: str):
+    start = time.perf_counter()
+    if endpoint == "ask":
+        response = await client.post("/api/ask", data={"question": text})
+    else:
+        response = await client.post("/api/extract", json={"lawText": text})
+    try:
+        ok = response.status_code == 200 and "error" not in response.json()
+    except ValueError:
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+async def probe(client: httpx.AsyncClient, interval: float, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/metrics")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    text = args.question or (DEFAULT_QUESTION if args.endpoint == "ask" else DEFAULT_LAW_TEXT)
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        stop = asyncio.Event()
+        probe_ms: list = []
+        probe_task = asyncio.create_task(probe(client, args.probe_interval, stop, probe_ms))
+
+        async def bounded():
+            async with semaphore:
+                try:
+                    return await send(client, args.endpoint, text)
+                except httpx.HTTPError:
+                    return None, False
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(bounded() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe_task
+
+    latencies = [ms for ms, ok in results if ok]
+    print(f"Endpoint /api/{args.endpoint}, concurrency {args.concurrency}, {args.requests} requests")
+    print(f"  succeeded      : {len(latencies)}/{args.requests}")
+    print(f"  wall time      : {elapsed:.1f} s")
+    print(f"  throughput     : {len(latencies) / elapsed:.2f} req/s")
+    if latencies:
+        print(f"  latency ms     : p50 {np.percentile(latencies, 50):.0f} | p95 {np.percentile(latencies, 95):.0f}")
+    if probe_ms:
+        print(f"  probe ms       : p50 {np.percentile(probe_ms, 50):.0f} | p95 {np.percentile(probe_ms, 95):.0f} "
+              f"| max {max(probe_ms):.0f}  (GET /api/metrics while under load)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for /api/ask and /api/extract")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["ask", "extract"], default="ask")
+    parser.add_argument("--question", default=None, help="Question (ask) or law text (extract).")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--probe-interval", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
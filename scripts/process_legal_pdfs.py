@@ -12,6 +12,7 @@ from dotenv import load_dotenv
 import google.generativeai as genai
 from app.database import SessionLocal, Base, engine
 from app.models import Document, Entity, EntityRelationship
+from app.pdf_cache import PDF_TEXT_CACHE_DIR, PDFTextCache
 from app.pdf_processor import extract_text_from_pdf, chunk_text
 
 load_dotenv()
@@ -20,6 +21,8 @@ Base.metadata.create_all(bind=engine)
 
 LEGAL_FOLDER = "legal"
 MODEL_NAME = "gemini-2.5-flash"
+# Shared with the API when PDF_TEXT_CACHE_DIR is set, so a law already uploaded to /api/ask is not parsed again
+PDF_TEXT_CACHE = PDFTextCache(disk_dir=PDF_TEXT_CACHE_DIR or "./pdf_text_cache")
 
 def clean_json_string(json_str: str) -> str:
     if not json_str:
@@ -230,7 +233,7 @@ def main():
         print(f"\nProcessing: {pdf_file}")
         pdf_path = os.path.join(LEGAL_FOLDER, pdf_file)
         
-        text = extract_text_from_pdf(pdf_path)
+        text = extract_text_from_pdf(pdf_path, cache=PDF_TEXT_CACHE)
         if not text:
             print("    Failed to extract text")
             continue
@@ -0,0 +1,26 @@
+import numpy as np
+
+from app.rag.answer_cache import SemanticAnswerCache, question_keys
+
+
+def always_valid(chunks):
+    return True
+
+
+def test_questions_differing_by_article_number_do_not_share_answers():
+    cache = SemanticAnswerCache(max_entries=4, threshold=0.96, ttl_seconds=60)
+    embedding = np.ones(8, dtype=np.float32) / np.sqrt(8)
+    asked = "ما نص المادة 152 من قانون العمل؟"
+    cache.put(embedding, [], "answer 152", ["labor.docx"], {}, 1000.0, question_keys(asked))
+
+    # Same embedding, different article number: must miss
+    other = "ما نص المادة 153 من قانون العمل؟"
+    assert cache.lookup(embedding, [], always_valid, question_keys(other)) is None
+
+    again = "ما نص المادة ١٥٢ من قانون العمل"
+    hit = cache.lookup(embedding, [], always_valid, question_keys(again))
+    assert hit is not None and hit["answer"] == "answer 152"
+
+
+def test_question_keys_include_law_reference():
+    assert question_keys("ما نص المادة 5 من قانون العمل") != question_keys("ما نص المادة 5 من قانون العقوبات")
@@ -0,0 +1,38 @@
+import re
+
+from app.rag.article_index import ArticleIndex
+
+
+def tokenize(text):
+    return [re.sub(r'^ال', '', w) for w in text.split() if len(w) > 1]
+
+
+def build(*filenames):
+    index = ArticleIndex()
+    ids, metadatas = [], []
+    for filename in filenames:
+        for number in (5, 152):
+            ids.append(f"{filename}:{number}")
+            metadatas.append({"filename": filename, "article_number": number, "chunk_index": number})
+    index.add(ids, metadatas)
+    return index
+
+
+def test_single_candidate_must_match_the_named_law():
+    index = build("قانون_العمل.docx")
+
+    assert index.resolve("ما نص المادة 152 من قانون العمل", tokenize) == ["قانون_العمل.docx:152"]
+    assert index.resolve("ما نص المادة 152 من قانون التجارة", tokenize) is None
+
+
+def test_single_candidate_without_law_reference_is_served():
+    index = build("قانون_العمل.docx")
+
+    assert index.resolve("ما نص المادة 5", tokenize) == ["قانون_العمل.docx:5"]
+
+
+def test_several_candidates_pick_the_named_law():
+    index = build("قانون_العمل.docx", "قانون_التجارة.docx")
+
+    assert index.resolve("ما نص المادة 5 من قانون التجارة", tokenize) == ["قانون_التجارة.docx:5"]
+    assert index.resolve("ما نص المادة 5", tokenize) is None
@@ -0,0 +1,39 @@
+from app.rag.context_packer import ContextPacker, _join_adjacent
+
+PREFIX = "سياق التشريع: قانون العمل | "
+
+
+class WordTokenizer:
+    def __call__(self, text, add_special_tokens=False):
+        return {"input_ids": text.split()}
+
+
+def test_join_keeps_line_breaks_and_drops_prefix_and_overlap():
+    first = PREFIX + "المادة 5\n1. على صاحب العمل أن يدفع الأجر\n2. في موعده المحدد"
+    second = PREFIX + "2. في موعده المحدد\n3. دون أي اقتطاع"
+
+    assert _join_adjacent(first, second) == (
+        PREFIX + "المادة 5\n1. على صاحب العمل أن يدفع الأجر\n2. في موعده المحدد\n3. دون أي اقتطاع"
+    )
+
+
+def test_join_without_overlap_starts_a_new_line():
+    assert _join_adjacent(PREFIX + "المادة 5\nنص أول", PREFIX + "نص ثان\nسطر آخر") == (
+        PREFIX + "المادة 5\nنص أول\nنص ثان\nسطر آخر"
+    )
+
+
+def test_packed_block_of_adjacent_chunks_keeps_article_header_line():
+    packer = ContextPacker(WordTokenizer(), token_budget=1000)
+    documents = [
+        PREFIX + "المادة 5\n1. على صاحب العمل أن يدفع الأجر كاملا",
+        PREFIX + "يدفع الأجر كاملا\n2. في موعده المحدد",
+    ]
+    metadatas = [{"filename": "قانون_العمل.docx", "chunk_index": i} for i in range(2)]
+
+    packed = packer.pack(documents, metadatas)
+
+    assert packed["blocks"] == [
+        "--- نص قانوني من تشريع: قانون_العمل.docx ---\n"
+        + PREFIX + "المادة 5\n1. على صاحب العمل أن يدفع الأجر كاملا\n2. في موعده المحدد"
+    ]
@@ -0,0 +1,42 @@
+import threading
+
+import numpy as np
+
+from app.rag.encoders import encode_bucketed
+
+
+class FakeTokenizer:
+    pad_token_id = 1
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, truncation, max_length):
+        self.calls.append((threading.get_ident(), len(texts)))
+        return {"input_ids": [[0] + [5] * min(len(t.split()), max_length - 2) + [2] for t in texts]}
+
+
+class FakeEncoder:
+    max_seq_length = 16
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+
+    def embed_features(self, features):
+        # Row i embeds to its number of real tokens
+        return features["attention_mask"].sum(axis=1, keepdims=True).astype(np.float32)
+
+
+def test_tokenizes_once_on_calling_thread_and_covers_every_text():
+    encoder = FakeEncoder()
+    texts = [" ".join(["كلمة"] * n) for n in (3, 40, 1, 7, 7, 12, 2)]
+
+    seen = {}
+    for indices, embeddings in encode_bucketed(encoder, texts, max_batch_tokens=32, max_batch_size=4, workers=2):
+        for i, emb in zip(indices, embeddings):
+            seen[int(i)] = float(emb[0])
+
+    assert encoder.tokenizer.calls == [(threading.get_ident(), len(texts))]
+    assert sorted(seen) == list(range(len(texts)))
+    assert seen[1] == encoder.max_seq_length
+    assert seen[2] == 3
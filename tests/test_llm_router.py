@@ -0,0 +1,50 @@
+import time
+
+from app import llm_router
+from app.llm_router import HedgedRouter, Provider
+
+
+def make_provider(name, state):
+    def call(messages):
+        if state["down"]:
+            raise RuntimeError(f"{name} down")
+        return name
+    return Provider(name, call)
+
+
+def test_failover_survives_breaker_trip_and_recovery(monkeypatch):
+    monkeypatch.setattr(llm_router, "BREAKER_COOLDOWN", 0.05)
+    groq_state, ollama_state = {"down": True}, {"down": True}
+    groq, ollama = make_provider("groq", groq_state), make_provider("ollama", ollama_state)
+    router = HedgedRouter([groq, ollama])
+
+    # Both providers fail until both breakers are open
+    while groq.state != "open" or ollama.state != "open":
+        try:
+            router.call([])
+        except RuntimeError:
+            pass
+
+    # Groq recovers first; its probe must not claim Ollama's probe
+    time.sleep(0.06)
+    groq_state["down"] = False
+    ollama_state["down"] = False
+    assert router.call([]) == ("groq", "groq")
+    assert groq.state == "closed"
+
+    # Groq fails again: the request still fails over to Ollama
+    groq_state["down"] = True
+    assert router.call([]) == ("ollama", "ollama")
+    assert ollama.state == "closed"
+
+
+def test_hedges_to_second_provider_when_first_is_slow(monkeypatch):
+    monkeypatch.setattr(llm_router, "HEDGE_FLOOR_MS", 20)
+
+    def slow(messages):
+        time.sleep(0.5)
+        return "groq"
+
+    router = HedgedRouter([Provider("groq", slow), Provider("ollama", lambda messages: "ollama")])
+    assert router.call([]) == ("ollama", "ollama")
+    assert router.stats()["routing"]["hedge_wins"] == 1
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+from app.pdf_processor import PDFTooLargeError, extract_pdf_pages, extract_text_from_pdf
+
+
+def test_missing_path_returns_none(tmp_path):
+    missing = str(tmp_path / "missing.pdf")
+
+    assert extract_pdf_pages(missing, cache=None) is None
+    assert extract_text_from_pdf(missing, cache=None) is None
+
+
+def test_oversized_upload_still_raises():
+    with pytest.raises(PDFTooLargeError):
+        extract_pdf_pages(b"%PDF-1.4" + b"0" * 64, max_bytes=16, cache=None)
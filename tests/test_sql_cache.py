@@ -0,0 +1,28 @@
+from app.sql_cache import TextToSQLCache, sql_template
+
+EARLIEST_SQL = (
+    "SELECT case_number, judgment_date FROM entities WHERE judgment_date IS NOT NULL AND judgment_date != '' "
+    "AND judgment_date LIKE '%/%' ORDER BY CASE WHEN replace(judgment_date, ' ', '') ~ '^\\d{{4}}' "
+    "THEN to_date(replace(judgment_date, ' ', ''), 'YYYY/MM/DD') "
+    "ELSE to_date(replace(judgment_date, ' ', ''), 'DD/MM/YYYY') END ASC LIMIT {limit};"
+)
+
+
+def test_regex_quantifier_is_not_a_slot():
+    cache = TextToSQLCache(namespace="test", disk_path=None)
+
+    assert cache.put("ما هي أبكر 4 قضايا من حيث التاريخ؟", EARLIEST_SQL.format(limit=4))
+    assert cache.get("ما هي أبكر 3 قضايا من حيث التاريخ؟") == EARLIEST_SQL.format(limit=3)
+
+
+def test_slot_value_repeated_in_sql_is_not_cached():
+    assert sql_template("SELECT * FROM entities WHERE a = '5' OR b = '5'", ["5"]) is None
+    assert sql_template("SELECT * FROM entities WHERE a = '6'", ["5"]) is None
+
+
+def test_case_number_is_rendered_for_a_new_question():
+    cache = TextToSQLCache(namespace="test", disk_path=None)
+    sql = "SELECT plaintiff FROM entities WHERE case_number = '563/2021'"
+
+    assert cache.put("من هو المدعي في القضية 563/2021", sql)
+    assert cache.get("من هو المدعي في القضية 476/2021") == sql.replace("563/2021", "476/2021")